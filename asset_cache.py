@@ -0,0 +1,147 @@
+"""Parallel image decoding and a cache of decoded pixels on disk.
+
+The sprite PNGs are large and are all scaled down, so most of startup goes to
+decoding them. load_pixels decodes the images in a thread pool (pygame releases the
+GIL while decoding and scaling) and keeps every scaled, flipped variant as raw RGBA
+pixels in assets/__cache__, keyed by a hash of the source file. A warm start only
+hashes the sources and maps the cached pixels in; no PNG is decoded.
+
+Cache file layout (little-endian): magic b"ZKPX", version (u8), width (u16),
+height (u16), then width * height RGBA pixels.
+
+    pixels, cached = load_pixels([("assets/images/ruby/tile000.png", (64, 64), False)])
+    size, data = pixels[("assets/images/ruby/tile000.png", (64, 64), False)]
+"""
+import concurrent.futures, hashlib, mmap, os, struct
+
+import pygame
+
+CACHE_DIRECTORY = "assets/__cache__"
+MAGIC = b"ZKPX"
+#bump when the cached pixel layout changes so old caches are rebuilt
+CACHE_VERSION = 1
+
+HEADER = struct.Struct("<4sBHH")
+
+
+def source_hash(path):
+    """return a hex digest of an image file's contents"""
+    with open(path, "rb") as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+
+def cache_path(directory, digest, size, flip):
+    """return where one scaled, flipped variant of a source image is kept"""
+    name = digest
+    if size:
+        name += "_" + str(size[0]) + "x" + str(size[1])
+    if flip:
+        name += "_flip"
+    return os.path.join(directory, name + ".rgba")
+
+
+def read_pixels(path):
+    """return the size and RGBA bytes of a cached variant, or None if it is missing or stale"""
+    try:
+        with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, version, width, height = HEADER.unpack_from(data)
+            if magic != MAGIC or version != CACHE_VERSION or len(data) != HEADER.size + width * height * 4:
+                return None
+            return (width, height), data[HEADER.size:]
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def write_pixels(path, size, data):
+    """save the RGBA bytes of a variant; a partly written file is never left in place"""
+    temporary = path + "." + str(os.getpid()) + ".tmp"
+    try:
+        with open(temporary, "wb") as file:
+            file.write(HEADER.pack(MAGIC, CACHE_VERSION, size[0], size[1]))
+            file.write(data)
+        os.replace(temporary, path)
+    except OSError:
+        #a read-only install still starts, it just decodes every time
+        pass
+
+
+def decode(path, variants):
+    """decode one source image and return {(size, flip): (size, RGBA bytes)} for each variant asked for"""
+    image = pygame.image.load(path)
+    pixels = {}
+    for size, flip in variants:
+        variant = pygame.transform.scale(image, size) if size else image
+        if flip:
+            variant = pygame.transform.flip(variant, True, False)
+        pixels[(size, flip)] = (variant.get_size(), pygame.image.tobytes(variant, "RGBA"))
+    return pixels
+
+
+def load_source(path, variants, directory, digest):
+    """return the pixels of every variant of one source image and the variants that came from the cache"""
+    if not directory:
+        return decode(path, variants), set()
+
+    pixels = {}
+    missing = []
+    for size, flip in variants:
+        cached = read_pixels(cache_path(directory, digest, size, flip))
+        if cached:
+            pixels[(size, flip)] = cached
+        else:
+            missing.append((size, flip))
+
+    if missing:
+        decoded = decode(path, missing)
+        for (size, flip), (actual_size, data) in decoded.items():
+            write_pixels(cache_path(directory, digest, size, flip), actual_size, data)
+        pixels.update(decoded)
+    return pixels, set(pixels) - set(missing)
+
+
+def load_pixels(specs, directory=CACHE_DIRECTORY, workers=None):
+    """decode every (path, size, flip) spec on a thread pool, reading and filling the disk cache
+
+    Returns {(path, size, flip): (size, RGBA bytes)} and how many variants came from the
+    cache. Pass directory=None to skip the disk cache. Sources with the same contents
+    are decoded once, so no two workers ever write the same cache file.
+    """
+    variants = {}
+    for path, size, flip in specs:
+        variants.setdefault(path, [])
+        if (size, flip) not in variants[path]:
+            variants[path].append((size, flip))
+
+    if directory:
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError:
+            directory = None
+
+    pixels = {}
+    cached = 0
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        #group the sources by contents; without a cache each path is its own group
+        if directory:
+            digests = dict(zip(variants, pool.map(source_hash, variants)))
+        else:
+            digests = {path: path for path in variants}
+        groups = {}
+        for path, digest in digests.items():
+            groups.setdefault(digest, []).append(path)
+
+        futures = {}
+        for digest, paths in groups.items():
+            group_variants = []
+            for path in paths:
+                group_variants += [variant for variant in variants[path] if variant not in group_variants]
+            futures[digest] = pool.submit(load_source, paths[0], group_variants, directory, digest)
+
+        for digest, future in futures.items():
+            source_pixels, source_cached = future.result()
+            for path in groups[digest]:
+                for size, flip in variants[path]:
+                    pixels[(path, size, flip)] = source_pixels[(size, flip)]
+                    if (size, flip) in source_cached:
+                        cached += 1
+    return pixels, cached
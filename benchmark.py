@@ -0,0 +1,200 @@
+"""Benchmark how frame cost scales with the number of zombies and rubies on screen.
+
+Runs the game headless with controlled populations, times every subsystem of the
+main loop and writes the results as JSON so runs can be compared:
+
+    python benchmark.py --counts 10 100 1000 --frames 300 --output bench.json
+    python benchmark.py --compare bench.json
+    python benchmark.py --replay session.zkr
+"""
+import argparse, json, platform, sys, time
+
+import pygame
+
+import zombie_knight
+
+
+def spawn_population(game, count):
+    """empty the game and fill it with count zombies and count rubies"""
+    game.reset_game()
+    if game.horde is not None:
+        game.horde.spawn(count, game.round_number, 5 + game.round_number)
+    for i in range(count):
+        if game.horde is None:
+            game.zombie_group.add(zombie_knight.ZOMBIE_POOL.acquire(game.platform_group, game.portal_group,
+                                                                    game.round_number, 5 + game.round_number, game.rng))
+        game.ruby_group.add(zombie_knight.RUBY_POOL.acquire(game.platform_group, game.portal_group, game.rng))
+
+    #keep the population from being wiped out by a game over or the end of the night
+    game.player.health = 10 ** 9
+    game.round_time = 10 ** 9
+
+
+def run_benchmark(game, count, frames, warmup):
+    """simulate frames with count zombies and rubies and return the timing summary"""
+    spawn_population(game, count)
+
+    #let sprites settle onto platforms before timing
+    game.profiler.enabled = False
+    for frame in range(warmup):
+        game.run_frame()
+
+    game.profiler.enabled = True
+    game.profiler.reset()
+    for frame in range(frames):
+        game.run_frame()
+    game.profiler.enabled = False
+
+    return {"count": count,
+            "frames": frames,
+            "sections": game.profiler.summary(),
+            "pair_tests": mean_count(game.profiler, "pair tests"),
+            "naive_pair_tests": mean_count(game.profiler, "naive pair tests"),
+            "final_zombies": len(game.horde) if game.horde is not None else len(game.zombie_group),
+            "final_rubies": len(game.ruby_group)}
+
+
+def run_replay(replay, full_redraw=False):
+    """re-simulate a recorded session, timing every frame, and return the timing summary"""
+    game = zombie_knight.create_game(headless=True, controls=replay["controls"], seed=replay["seed"],
+                                     level_path=replay["level"])
+    game.renderer.full_redraw = full_redraw
+    if replay["horde"]:
+        zombie_knight.use_horde(game)
+    game.reset_game()
+
+    game.profiler.enabled = True
+    for frame in range(replay["frames"]):
+        game.run_frame()
+    game.profiler.enabled = False
+
+    return {"count": "replay",
+            "frames": replay["frames"],
+            "sections": game.profiler.summary(),
+            "pair_tests": mean_count(game.profiler, "pair tests"),
+            "naive_pair_tests": mean_count(game.profiler, "naive pair tests"),
+            "final_zombies": len(game.horde) if game.horde is not None else len(game.zombie_group),
+            "final_rubies": len(game.ruby_group)}
+
+
+def mean_count(profiler, name):
+    """return the mean per-frame value of a profiler count"""
+    values = [frame.get("counts", {}).get(name, 0) for frame in profiler.frames]
+    return sum(values) / len(values) if values else 0
+
+
+def print_results(results):
+    """print a table of p50/p90/p99 ms/frame per subsystem"""
+    sections = zombie_knight.FrameProfiler.SECTIONS + ["total"]
+    print("count".rjust(7) + "".join(section.rjust(22) for section in sections))
+    for result in results:
+        line = str(result["count"]).rjust(7)
+        for section in sections:
+            stats = result["sections"].get(section, {"p50": 0, "p90": 0, "p99": 0})
+            line += ("%.2f/%.2f/%.2f" % (stats["p50"], stats["p90"], stats["p99"])).rjust(22)
+        print(line)
+    print("(ms/frame as p50/p90/p99)")
+    for result in results:
+        print(str(result["count"]).rjust(7) + "  collision rect tests/frame: " + str(round(result["pair_tests"])) +
+              " (" + str(round(result["naive_pair_tests"])) + " testing every pair)")
+
+
+def compare_results(baseline, results, threshold):
+    """print the p50 change per subsystem against a baseline run; return True if anything regressed"""
+    regressed = False
+    baseline_by_count = {result["count"]: result for result in baseline["results"]}
+    for result in results:
+        old = baseline_by_count.get(result["count"])
+        if not old:
+            continue
+        for section, stats in result["sections"].items():
+            if section not in old["sections"]:
+                continue
+            before = old["sections"][section]["p50"]
+            after = stats["p50"]
+            if before <= 0:
+                continue
+            change = (after - before) / before
+            flag = ""
+            if change > threshold:
+                flag = "  REGRESSION"
+                regressed = True
+            print("%7s %-12s %8.3f -> %8.3f ms  (%+.1f%%)%s" % (result["count"], section, before, after,
+                                                                change * 100, flag))
+    return regressed
+
+
+def main():
+    """run the benchmark from the command line"""
+    parser = argparse.ArgumentParser(description="Zombie Knight frame benchmark")
+    parser.add_argument("--counts", type=int, nargs="+",
+                        help="zombie (and ruby) populations to test (default 10 100 1000 10000)")
+    parser.add_argument("--frames", type=int, default=120, help="timed frames per population")
+    parser.add_argument("--warmup", type=int, default=30, help="untimed frames before timing")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for spawning")
+    parser.add_argument("--full-redraw", action="store_true",
+                        help="redraw the whole screen every frame instead of only dirty rects")
+    parser.add_argument("--level", help="level file to play (a replay defaults to the level it was recorded on)")
+    parser.add_argument("--engine", choices=["sprites", "horde"], default="sprites",
+                        help="run zombies as sprites or on the NumPy horde engine")
+    parser.add_argument("--replay", help="time a session recorded with zombie_knight.py --record instead")
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--compare", help="compare against a previous JSON results file")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative p50 slowdown that counts as a regression")
+    args = parser.parse_args()
+    if args.replay and args.counts:
+        parser.error("--counts cannot be used with --replay, which times the recorded session instead")
+    counts = args.counts or ([] if args.replay else [10, 100, 1000, 10000])
+    level_path = args.level or zombie_knight.DEFAULT_LEVEL
+
+    game = zombie_knight.create_game(headless=True, seed=args.seed, level_path=level_path)
+    game.renderer.full_redraw = args.full_redraw
+    if args.engine == "horde":
+        zombie_knight.use_horde(game)
+
+    results = []
+    if args.replay:
+        start = time.perf_counter()
+        try:
+            session = zombie_knight.load_replay(args.replay, args.level)
+        except ValueError as error:
+            parser.error(str(error))
+        level_path = session["level"]
+        results.append(run_replay(session, args.full_redraw))
+        print("ran " + args.replay + " in " + str(round(time.perf_counter() - start, 2)) + "s", file=sys.stderr)
+    for count in counts:
+        start = time.perf_counter()
+        results.append(run_benchmark(game, count, args.frames, args.warmup))
+        print("ran " + str(count) + " in " + str(round(time.perf_counter() - start, 2)) + "s", file=sys.stderr)
+
+    print_results(results)
+
+    report = {"meta": {"python": platform.python_version(),
+                       "pygame": pygame.version.ver,
+                       "platform": platform.platform(),
+                       "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "frames": args.frames,
+                       "warmup": args.warmup,
+                       "seed": args.seed,
+                       "full_redraw": args.full_redraw,
+                       "engine": args.engine,
+                       "level": level_path,
+                       "replay": args.replay},
+              "results": results}
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    regressed = False
+    if args.compare:
+        with open(args.compare) as file:
+            regressed = compare_results(json.load(file), results, args.threshold)
+
+    pygame.quit()
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
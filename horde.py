@@ -0,0 +1,287 @@
+"""A NumPy horde engine for very large numbers of zombies.
+
+Each Zombie sprite carries its own vectors and runs its own move, collision and
+animation code, so Python overhead caps how many can be on screen. Horde keeps the
+same state for every zombie in NumPy arrays (one row per zombie) and steps the whole
+horde at once, following the same rules as Zombie.update: gravity, wrap-around,
+landing on platforms, portal teleports, walking, dying, staying down for RISE_TIME
+seconds and rising again.
+
+    horde = Horde(game.platform_group, game.portal_group, (width, height), ZOMBIE_SPRITES,
+                  {"hit": hit_sound, "kick": kick_sound, "portal": portal_sound}, seed=0)
+    horde.spawn(5000, 1, 6)
+    horde.step()
+    #Game.draw blits only the zombies under the camera, at their positions on screen
+    game.renderer.draw_blits(horde.blits(game.camera.view))
+
+The game hands a horde everything it needs (zombie_knight.use_horde does this), so
+this module does not import the game. NumPy is only needed by this module; the game
+itself does not depend on it.
+"""
+import numpy as np
+
+#animation clips, in the order of Horde.frame_table
+WALK = 0
+DIE = 1
+RISE = 2
+
+
+def pixel(values):
+    """round coordinates to whole pixels the way pygame.Rect does (halves away from zero)"""
+    return (np.sign(values) * np.floor(np.abs(values) + 0.5)).astype(np.int64)
+
+
+class Horde:
+    """Every zombie's state in parallel arrays, stepped in vectorized passes"""
+
+    def __init__(self, platform_group, portal_group, world_size, zombie_sprites, sounds, fps=60, seed=None):
+        """initialize an empty horde
+
+        world_size is the level's (width, height), zombie_sprites the game's frames by gender
+        and clip (as in zombie_knight.ZOMBIE_SPRITES), sounds the "hit", "kick" and "portal"
+        sounds, and fps the steps in a second of game time.
+        """
+        #set constant variables (the same as Zombie)
+        self.VERTICAL_ACCEL = 3 #gravity
+        self.RISE_TIME = 2
+        self.SIZE = 64
+        self.FRAMES = 10
+        self.FPS = fps
+
+        self.world_width, self.world_height = world_size
+        self.rng = np.random.default_rng(seed)
+
+        #platform and portal rects as (left, top, right, bottom) rows, in group order
+        self.platforms = self.rect_array(platform_group)
+        self.portals = self.rect_array(portal_group)
+        self.portal_table = portal_group.destinations
+
+        #sounds; the portal sound plays at most once a step however many zombies teleport
+        self.hit_sound = sounds["hit"]
+        self.kick_sound = sounds["kick"]
+        self.portal_sound = sounds["portal"]
+        self.teleports = 0
+
+        #frame_table[code] is the surface for a gender, clip, direction and frame number
+        self.frame_table = self.build_frame_table(zombie_sprites)
+
+        #per-zombie state
+        self.position = np.zeros((0, 2))
+        self.velocity = np.zeros((0, 2))
+        self.rect_x = np.zeros(0, dtype=np.int64)
+        self.rect_y = np.zeros(0, dtype=np.int64)
+        self.direction = np.zeros(0, dtype=np.int64)
+        self.gender = np.zeros(0, dtype=np.int64)
+        self.clip = np.zeros(0, dtype=np.int64)
+        self.current_sprite = np.zeros(0)
+        #the frame shown, which (like Zombie.image) only changes when a zombie is animated
+        self.frame = np.zeros(0, dtype=np.int64)
+        self.is_dead = np.zeros(0, dtype=bool)
+        self.animate_death = np.zeros(0, dtype=bool)
+        self.animate_rise = np.zeros(0, dtype=bool)
+        self.frame_count = np.zeros(0, dtype=np.int64)
+        self.round_time = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        """return the number of zombies in the horde"""
+        return len(self.position)
+
+    def rect_array(self, group):
+        """return the rects of a group's sprites as an (n, 4) array of left, top, right, bottom"""
+        rects = [sprite.rect for sprite in group.sprites()]
+        return np.array([[rect.left, rect.top, rect.right, rect.bottom] for rect in rects],
+                        dtype=np.int64).reshape(-1, 4)
+
+    def build_frame_table(self, zombie_sprites):
+        """return a flat object array of every zombie frame, indexed by frame_code()"""
+        table = []
+        for gender in [0, 1]:
+            sprites = zombie_sprites[gender]
+            #rising always uses the right-facing frames, as Zombie does
+            clips = [[sprites["walk_left"], sprites["walk_right"]],
+                     [sprites["die_left"], sprites["die_right"]],
+                     [sprites["rise_right"], sprites["rise_right"]]]
+            for clip in clips:
+                for frames in clip:
+                    table.extend(frames)
+
+        frame_table = np.empty(len(table), dtype=object)
+        frame_table[:] = table
+        return frame_table
+
+    def frame_codes(self):
+        """return every zombie's index into frame_table"""
+        facing_right = (self.direction == 1).astype(np.int64)
+        return ((self.gender * 3 + self.clip) * 2 + facing_right) * self.FRAMES + self.frame
+
+    def spawn(self, count, min_speed, max_speed):
+        """add count zombies above the screen, like Zombie.reset"""
+        gender = self.rng.integers(0, 2, count)
+        direction = self.rng.choice([-1, 1], count)
+        x = self.rng.integers(100, self.world_width - 100, count, endpoint=True)
+        speed = self.rng.integers(min_speed, max_speed, count, endpoint=True)
+
+        #the rect's bottomleft is placed at (x, -100), and position starts at the rect's topleft
+        position = np.column_stack([x, np.full(count, -100 - self.SIZE)]).astype(float)
+        velocity = np.column_stack([direction * speed, np.zeros(count)]).astype(float)
+
+        self.position = np.concatenate([self.position, position])
+        self.velocity = np.concatenate([self.velocity, velocity])
+        self.rect_x = np.concatenate([self.rect_x, x])
+        self.rect_y = np.concatenate([self.rect_y, np.full(count, -100 - self.SIZE)])
+        self.direction = np.concatenate([self.direction, direction])
+        self.gender = np.concatenate([self.gender, gender])
+        self.clip = np.concatenate([self.clip, np.full(count, WALK)])
+        self.current_sprite = np.concatenate([self.current_sprite, np.zeros(count)])
+        self.frame = np.concatenate([self.frame, np.zeros(count, dtype=np.int64)])
+        for name in ["is_dead", "animate_death", "animate_rise"]:
+            setattr(self, name, np.concatenate([getattr(self, name), np.zeros(count, dtype=bool)]))
+        self.frame_count = np.concatenate([self.frame_count, np.zeros(count, dtype=np.int64)])
+        self.round_time = np.concatenate([self.round_time, np.zeros(count, dtype=np.int64)])
+
+    def remove(self, indices):
+        """remove the zombies at indices (an index array or boolean mask)"""
+        keep = np.ones(len(self), dtype=bool)
+        keep[indices] = False
+        for name in ["position", "velocity", "rect_x", "rect_y", "direction", "gender", "clip", "current_sprite",
+                     "frame", "is_dead", "animate_death", "animate_rise", "frame_count", "round_time"]:
+            setattr(self, name, getattr(self, name)[keep])
+
+    def clear(self):
+        """remove every zombie"""
+        self.remove(np.arange(len(self)))
+
+    def animate(self, selected, speed, hold=False):
+        """advance the animation of the selected zombies; return the ones that reached the end
+
+        Finished animations start over, or stay on their last frame if hold is True.
+        """
+        advancing = selected & (self.current_sprite < self.FRAMES - 1)
+        finished = selected & ~advancing
+        self.current_sprite[advancing] += speed
+        self.current_sprite[finished] = self.FRAMES - 1 if hold else 0
+        self.frame[selected] = self.current_sprite[selected].astype(np.int64)
+        return finished
+
+    def step(self):
+        """advance every zombie by one frame"""
+        if not len(self):
+            return
+        width = self.world_width
+
+        #move: living zombies walk, fall and wrap around the screen
+        living = ~self.is_dead
+        self.clip[living] = WALK
+        self.animate(living, 0.5)
+
+        self.velocity[living, 1] += self.VERTICAL_ACCEL
+        self.position[living] += self.velocity[living]
+        self.position[living, 1] += 0.5 * self.VERTICAL_ACCEL
+        x = self.position[:, 0]
+        x[living & (x < 0)] = width
+        x[living & (x > width)] = 0
+        self.rect_x[living] = pixel(self.position[living, 0])
+        self.rect_y[living] = pixel(self.position[living, 1]) - self.SIZE
+
+        #land on the first platform touched
+        if len(self.platforms):
+            touching = self.overlaps(self.platforms)
+            landed = touching.any(axis=1)
+            first = touching.argmax(axis=1)
+            self.position[landed, 1] = self.platforms[first[landed], 1] + 1
+            self.velocity[landed, 1] = 0
+
+        #teleport through portals
+        if len(self.portals):
+            teleported = self.overlaps(self.portals).any(axis=1)
+            if teleported.any():
+                self.teleports += int(teleported.sum())
+                self.portal_sound.play()
+                split_x, split_y = self.portal_table["split"]
+                right = self.position[:, 0] > split_x
+                low = self.position[:, 1] > split_y
+                self.position[teleported & right, 0] = self.portal_table["x"][0]
+                self.position[teleported & ~right, 0] = self.portal_table["x"][1]
+                self.position[teleported & low, 1] = self.portal_table["y"][0]
+                self.position[teleported & ~low, 1] = self.portal_table["y"][1]
+
+        #dying zombies play their death once and then hold the last frame
+        dying = self.animate_death.copy()
+        self.clip[dying] = DIE
+        done = self.animate(dying, .095, hold=True)
+        self.animate_death[done] = False
+
+        #rising zombies play their rise and then walk again
+        rising = self.animate_rise.copy()
+        self.clip[rising] = RISE
+        done = self.animate(rising, .095)
+        self.animate_rise[done] = False
+        self.is_dead[done] = False
+        self.frame_count[done] = 0
+        self.round_time[done] = 0
+
+        #dead zombies rise after RISE_TIME seconds
+        dead = self.is_dead
+        self.frame_count[dead] += 1
+        second = dead & (self.frame_count % self.FPS == 0)
+        self.round_time[second] += 1
+        rise = second & (self.round_time == self.RISE_TIME)
+        self.animate_rise[rise] = True
+        self.current_sprite[rise] = 0
+
+    def overlaps(self, rects):
+        """return an (n zombies, n rects) array of which zombie rects overlap which rects"""
+        left = self.rect_x[:, None]
+        top = self.rect_y[:, None]
+        return ((left < rects[None, :, 2]) & (left + self.SIZE > rects[None, :, 0]) &
+                (top < rects[None, :, 3]) & (top + self.SIZE > rects[None, :, 1]))
+
+    def hit(self, rect):
+        """kill the zombies overlapping rect, as a bullet does; return how many were hit"""
+        hits = self.touching(rect)
+        self.is_dead[hits] = True
+        self.animate_death[hits] = True
+        return int(hits.sum())
+
+    def kick(self, rect):
+        """remove the dead zombies overlapping rect, as the player does; return how many were kicked"""
+        kicked = self.touching(rect) & self.is_dead
+        count = int(kicked.sum())
+        if count:
+            self.remove(kicked)
+        return count
+
+    def attackers(self, rect):
+        """return the directions of the living zombies overlapping rect"""
+        return self.direction[self.touching(rect) & ~self.is_dead].tolist()
+
+    def thieves(self, rects):
+        """return, for each of a list of rects, the index of the first living zombie overlapping it, or -1"""
+        if not len(self) or not rects:
+            return [-1] * len(rects)
+        rect_array = np.array([[rect.left, rect.top, rect.right, rect.bottom] for rect in rects], dtype=np.int64)
+        touching = self.overlaps(rect_array) & ~self.is_dead[:, None]
+        return np.where(touching.any(axis=0), touching.argmax(axis=0), -1).tolist()
+
+    def touching(self, rect):
+        """return a boolean array of the zombies whose rect overlaps rect"""
+        return ((self.rect_x < rect.right) & (self.rect_x + self.SIZE > rect.left) &
+                (self.rect_y < rect.bottom) & (self.rect_y + self.SIZE > rect.top))
+
+    def blits(self, view=None):
+        """return an (image, position) pair for every zombie, ready for Surface.blits
+
+        With a view (a rect in world coordinates), only zombies overlapping it are
+        returned, at their positions on screen.
+        """
+        if view is None:
+            images = self.frame_table[self.frame_codes()]
+            return list(zip(images, zip(self.rect_x.tolist(), self.rect_y.tolist())))
+
+        visible = self.touching(view)
+        images = self.frame_table[self.frame_codes()[visible]]
+        return list(zip(images, zip((self.rect_x[visible] - view.x).tolist(), (self.rect_y[visible] - view.y).tolist())))
+
+    def draw(self, surface):
+        """draw every zombie and return the rects drawn"""
+        return surface.blits(self.blits())
@@ -0,0 +1,148 @@
+"""Level files and their compiled cache.
+
+A level file is a grid of tile codes, one character per 32 px tile:
+
+    0 --> no tile, 1 --> dirt tile, 2-5 --> platforms (2 ground, 3 left, 4 middle, 5 right),
+    6 --> ruby maker, 7-8 --> portals (green, purple), 9 --> player
+
+Lines starting with # are comments, and "name = value" lines set level options: the
+portal destinations (portal_left, portal_right, portal_top, portal_bottom, in pixels).
+
+Compiling a level works out everything build_level needs from the grid: the tiles, the
+merged platform colliders, the collision grid those colliders are filed under, the
+portal destination table and the player and ruby spawn points. The result is saved with
+marshal (plain ints, tuples, lists and dicts only, so loading a cache cannot run code)
+next to the level in a __cache__ directory and reused until the level file changes.
+
+    level = load_level("levels/level1.txt")
+"""
+import marshal, os, zlib
+
+TILE_SIZE = 32
+#bump when the compiled layout changes so old caches are rebuilt
+CACHE_VERSION = 3
+
+PLATFORM_CODES = [2, 3, 4, 5]
+PORTAL_COLORS = {7: "green", 8: "purple"}
+
+
+def parse_level(text):
+    """return the tile code rows and the options of a level file's text"""
+    rows = []
+    options = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if "=" in line:
+            name, value = line.split("=", 1)
+            options[name.strip()] = int(value)
+        else:
+            rows.append([int(character) for character in line])
+    return rows, options
+
+
+def compile_level(rows, options):
+    """work out the tiles, colliders, collision grid, portal table and spawn point of a level"""
+    width = max(len(row) for row in rows) * TILE_SIZE
+    height = len(rows) * TILE_SIZE
+    level = {"width": width,
+             "height": height,
+             "tiles": [],
+             "ruby_makers": [],
+             "portals": [],
+             "player": None,
+             "platforms": [],
+             "grid": {}}
+
+    #everything but the platform colliders, in the order the old tile loop built it
+    for i in range(len(rows)):
+        for j in range(len(rows[i])):
+            code = rows[i][j]
+            x = j * TILE_SIZE
+            y = i * TILE_SIZE
+            if code == 1 or code in PLATFORM_CODES:
+                level["tiles"].append((x, y, code))
+            elif code == 6:
+                level["ruby_makers"].append((x, y))
+            elif code in PORTAL_COLORS:
+                level["portals"].append((x, y, PORTAL_COLORS[code]))
+            elif code == 9:
+                level["player"] = (x - TILE_SIZE, y + TILE_SIZE)
+
+    if level["player"] is None:
+        raise ValueError("the level has no player start (tile code 9)")
+
+    #merge each horizontal run of platform tiles into one collider, as (x, y, tile count)
+    for i in range(len(rows)):
+        start = None
+        for j in range(len(rows[i]) + 1):
+            is_platform = j < len(rows[i]) and rows[i][j] in PLATFORM_CODES
+            if is_platform and start is None:
+                start = j
+            elif not is_platform and start is not None:
+                level["platforms"].append((start * TILE_SIZE, i * TILE_SIZE, j - start))
+                start = None
+
+    #file every collider under the grid cells it covers
+    for index, (x, y, count) in enumerate(level["platforms"]):
+        for column in range(x // TILE_SIZE, x // TILE_SIZE + count):
+            level["grid"].setdefault((column, y // TILE_SIZE), []).append(index)
+
+    #rubies drop out of the first ruby maker
+    if level["ruby_makers"]:
+        x, y = level["ruby_makers"][0]
+        level["ruby_spawn"] = (x + TILE_SIZE, y + 4)
+    else:
+        level["ruby_spawn"] = (width // 2, 100)
+
+    #sprites in the right half go to the left portals and vice versa, top to bottom likewise
+    level["portal_table"] = {"split": (width // 2, height // 2),
+                             "x": (options.get("portal_left", 86), options.get("portal_right", width - 150)),
+                             "y": (options.get("portal_top", 64), options.get("portal_bottom", height - 132))}
+    return level
+
+
+def level_hash(path):
+    """return the CRC-32 of a level file, which replays record to check they play the same map"""
+    with open(path, "rb") as file:
+        return zlib.crc32(file.read())
+
+
+def cache_path(path):
+    """return where the compiled form of a level file is kept"""
+    directory, name = os.path.split(path)
+    return os.path.join(directory, "__cache__", os.path.splitext(name)[0] + ".marshal")
+
+
+def load_level(path, use_cache=True):
+    """return a compiled level, from the cache if the level file has not changed since
+
+    Raises ValueError if the level file cannot be played.
+    """
+    stat = os.stat(path)
+    key = (CACHE_VERSION, marshal.version, stat.st_mtime_ns, stat.st_size)
+    cached = cache_path(path)
+
+    if use_cache and os.path.exists(cached):
+        try:
+            with open(cached, "rb") as file:
+                cached_key, level = marshal.load(file)
+            if cached_key == key and isinstance(level, dict):
+                return level
+        except (OSError, EOFError, ValueError, TypeError):
+            #unreadable or from another version: compile it again
+            pass
+
+    with open(path) as file:
+        level = compile_level(*parse_level(file.read()))
+
+    if use_cache:
+        try:
+            os.makedirs(os.path.dirname(cached), exist_ok=True)
+            with open(cached, "wb") as file:
+                marshal.dump((key, level), file)
+        except OSError:
+            #a read-only install still plays, it just compiles every time
+            pass
+    return level
@@ -0,0 +1,223 @@
+"""A compact binary log of a recorded session: input changes and state checkpoints.
+
+A session that only logs the frames where something changed still runs to tens of
+thousands of frames over a long soak, so the log is binary, written by a background
+thread so the main loop never waits on the disk, and read back as a stream so a file
+never has to fit in memory.
+
+File layout (little-endian):
+
+    header      magic b"ZKRP", version (u8), seed (u64), flags (u8, bit 0 = horde engine),
+                frames (u32), checksum (u32), key count (u8), key codes (u32 each),
+                level file CRC-32 (u32), level path length (u16), level path (UTF-8)
+    records     type (u8), frames since the previous record (varint), then
+                INPUT       held keys as a bitmask over the key codes (varint),
+                            tap count (u8), tapped key indices (u8 each)
+                CHECKPOINT  score, health, round, zombie count (zigzag varints)
+
+frames and checksum are filled in when the writer is closed. The level is part of the
+header because the same input plays out differently on another map.
+
+    writer = ReplayWriter("session.zkr", seed, keys, level_path="levels/level1.txt", level_hash=crc)
+    writer.write_input(frame, held, tapped)
+    writer.close(frames, checksum)
+
+    reader = ReplayReader("session.zkr")
+    for record in reader.records():
+        ...
+
+Run as a script to summarize a log: python replay.py session.zkr
+"""
+import queue, struct, sys, threading
+
+MAGIC = b"ZKRP"
+VERSION = 2
+
+HEADER = struct.Struct("<4sBQBIIB")
+#after the key codes: the level file's CRC-32 and the length of its path
+LEVEL = struct.Struct("<IH")
+#offset of the frames and checksum fields, patched on close
+TOTALS = struct.Struct("<II")
+TOTALS_OFFSET = 4 + 1 + 8 + 1
+
+#record types
+INPUT = 1
+CHECKPOINT = 2
+
+#header flags
+HORDE = 1
+
+
+def encode_varint(value):
+    """return an unsigned integer as LEB128 bytes"""
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+def encode_signed(value):
+    """return a signed integer as zigzag LEB128 bytes"""
+    return encode_varint(value * 2 if value >= 0 else -value * 2 - 1)
+
+def read_varint(file):
+    """read an unsigned LEB128 integer from a file; return None at the end of the file"""
+    value = 0
+    shift = 0
+    while True:
+        byte = file.read(1)
+        if not byte:
+            return None
+        value |= (byte[0] & 0x7f) << shift
+        if byte[0] < 0x80:
+            return value
+        shift += 7
+
+def read_signed(file):
+    """read a zigzag LEB128 integer from a file"""
+    value = read_varint(file)
+    return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+
+class ReplayWriter:
+    """Writes a replay log from a background thread.
+
+    The write_ methods only pack a few bytes and queue them; the thread does the file
+    I/O. Records must be written in frame order.
+    """
+
+    def __init__(self, path, seed, keys, horde=False, level_path="", level_hash=0):
+        """open the log and start the writer thread"""
+        self.keys = list(keys)
+        self.key_index = {key: i for i, key in enumerate(self.keys)}
+        self.last_frame = 0
+        self.records = 0
+
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, seed, HORDE if horde else 0, 0, 0, len(self.keys)))
+        self.file.write(struct.pack("<" + str(len(self.keys)) + "I", *self.keys))
+        level_bytes = level_path.encode("utf-8")
+        self.file.write(LEVEL.pack(level_hash, len(level_bytes)) + level_bytes)
+
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name="replay-writer", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        """write queued records until close() sends None"""
+        while True:
+            data = self.queue.get()
+            if data is None:
+                break
+            self.file.write(data)
+
+    def frame_delta(self, frame):
+        """return the frames since the last record and move on to this one"""
+        delta = frame - self.last_frame
+        self.last_frame = frame
+        self.records += 1
+        return encode_varint(delta)
+
+    def write_input(self, frame, held, tapped):
+        """log the keys held and the keys tapped on a frame"""
+        mask = 0
+        for key in held:
+            mask |= 1 << self.key_index[key]
+        indices = [self.key_index[key] for key in tapped]
+        self.queue.put(bytes([INPUT]) + self.frame_delta(frame) + encode_varint(mask) + bytes([len(indices)]) +
+                       bytes(indices))
+
+    def write_checkpoint(self, frame, score, health, round_number, zombies):
+        """log a snapshot of the game state on a frame"""
+        self.queue.put(bytes([CHECKPOINT]) + self.frame_delta(frame) + encode_signed(score) + encode_signed(health) +
+                       encode_signed(round_number) + encode_signed(zombies))
+
+    def close(self, frames, checksum=0):
+        """finish writing, record the session length and final checksum and close the file"""
+        self.queue.put(None)
+        self.thread.join()
+        self.file.seek(TOTALS_OFFSET)
+        self.file.write(TOTALS.pack(frames, checksum))
+        self.file.close()
+
+
+class ReplayReader:
+    """Reads a replay log's header and streams its records"""
+
+    def __init__(self, path):
+        """read the header"""
+        self.path = path
+        with open(path, "rb") as file:
+            self.read_header(file)
+
+    def read_header(self, file):
+        """read the header fields; leave the file at the first record"""
+        magic, version, self.seed, flags, self.frames, self.checksum, key_count = HEADER.unpack(file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(self.path + " is not a replay log")
+        if version != VERSION:
+            raise ValueError(self.path + " is replay version " + str(version) + ", expected " + str(VERSION))
+        self.horde = bool(flags & HORDE)
+        self.keys = list(struct.unpack("<" + str(key_count) + "I", file.read(4 * key_count)))
+        self.level_hash, length = LEVEL.unpack(file.read(LEVEL.size))
+        self.level_path = file.read(length).decode("utf-8")
+
+    def records(self):
+        """yield ("input", frame, held keys, tapped keys) and ("checkpoint", frame, state) records in order"""
+        with open(self.path, "rb") as file:
+            self.read_header(file)
+            frame = 0
+            while True:
+                record_type = file.read(1)
+                if not record_type:
+                    return
+                frame += read_varint(file)
+                if record_type[0] == INPUT:
+                    mask = read_varint(file)
+                    held = [key for i, key in enumerate(self.keys) if mask & (1 << i)]
+                    tapped = [self.keys[i] for i in file.read(file.read(1)[0])]
+                    yield ("input", frame, held, tapped)
+                elif record_type[0] == CHECKPOINT:
+                    state = {"score": read_signed(file), "health": read_signed(file),
+                             "round": read_signed(file), "zombies": read_signed(file)}
+                    yield ("checkpoint", frame, state)
+                else:
+                    raise ValueError(self.path + " has an unknown record type " + str(record_type[0]))
+
+    def inputs(self):
+        """yield (frame, held keys, tapped keys) for every input record, as ScriptedInput takes them"""
+        for record in self.records():
+            if record[0] == "input":
+                yield record[1:]
+
+
+def summarize(path):
+    """print an overview of a replay log, reading it as a stream"""
+    reader = ReplayReader(path)
+    inputs = 0
+    taps = 0
+    checkpoints = 0
+    last_state = None
+    for record in reader.records():
+        if record[0] == "input":
+            inputs += 1
+            taps += len(record[3])
+        else:
+            checkpoints += 1
+            last_state = record[2]
+
+    print(path + ": seed " + str(reader.seed) + ", " + str(reader.frames) + " frames on " + reader.level_path +
+          (" (horde engine)" if reader.horde else ""))
+    print(str(inputs) + " input changes, " + str(taps) + " taps, " + str(checkpoints) + " checkpoints")
+    if last_state:
+        print("last checkpoint: score " + str(last_state["score"]) + ", health " + str(last_state["health"]) +
+              ", night " + str(last_state["round"]) + ", " + str(last_state["zombies"]) + " zombies")
+
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        summarize(path)
@@ -1,9 +1,8 @@
-import pygame, random
+import pygame, random, os, time, argparse, collections, csv, json, zlib, heapq
 
-"""GAME SETUP"""
-#Initialize Pygame
-pygame.init()
+import asset_cache, level, replay
 
+"""GAME SETUP"""
 #use 2d vectors
 VECTOR = pygame.math.Vector2
 
@@ -11,179 +10,1403 @@ VECTOR = pygame.math.Vector2
 ##tile height is 32x32; 40 tiles wide & 23 tiles high
 WINDOW_WIDTH = 1280
 WINDOW_HEIGHT = 736
-DISPLAY_SURFACE = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
-pygame.display.set_caption("Zombie Knight!")
+#the display surface is created by setup_display() so importing this module has no side effects
+DISPLAY_SURFACE = None
+
+#the level being played can be bigger than the window; set_world() sets its size
+WORLD_WIDTH = WINDOW_WIDTH
+WORLD_HEIGHT = WINDOW_HEIGHT
+#where new rubies appear
+RUBY_SPAWN = (WINDOW_WIDTH//2, 100)
 
 #Set FPS and Clock
 FPS = 60
 CLOCK = pygame.time.Clock()
 
-#load in Zombie assets
-#walking
-walk_right_sprites_0 = []
-walk_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/walk/Walk (1).png"), (64, 64)))
-walk_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/walk/Walk (2).png"), (64, 64)))
-walk_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/walk/Walk (3).png"), (64, 64)))
-walk_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/walk/Walk (4).png"), (64, 64)))
-walk_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/walk/Walk (5).png"), (64, 64)))
-walk_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/walk/Walk (6).png"), (64, 64)))
-walk_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/walk/Walk (7).png"), (64, 64)))
-walk_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/walk/Walk (8).png"), (64, 64)))
-walk_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/walk/Walk (9).png"), (64, 64)))
-walk_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/walk/Walk (10).png"), (64, 64)))
-walk_left_sprites_0 = []
-for sprite in walk_right_sprites_0:
-    walk_left_sprites_0.append(pygame.transform.flip(sprite, True, False))
-#dying
-die_right_sprites_0 = []
-die_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/dead/Dead (1).png"), (64, 64)))
-die_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/dead/Dead (2).png"), (64, 64)))
-die_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/dead/Dead (3).png"), (64, 64)))
-die_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/dead/Dead (4).png"), (64, 64)))
-die_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/dead/Dead (5).png"), (64, 64)))
-die_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/dead/Dead (6).png"), (64, 64)))
-die_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/dead/Dead (7).png"), (64, 64)))
-die_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/dead/Dead (8).png"), (64, 64)))
-die_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/dead/Dead (9).png"), (64, 64)))
-die_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/dead/Dead (10).png"), (64, 64)))
-die_left_sprites_0 = []
-for sprite in die_right_sprites_0:
-    die_left_sprites_0.append(pygame.transform.flip(sprite, True, False))
-#rising
-rise_right_sprites_0 = []
-rise_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/dead/Dead (10).png"), (64, 64)))
-rise_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/dead/Dead (9).png"), (64, 64)))
-rise_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/dead/Dead (8).png"), (64, 64)))
-rise_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/dead/Dead (7).png"), (64, 64)))
-rise_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/dead/Dead (6).png"), (64, 64)))
-rise_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/dead/Dead (5).png"), (64, 64)))
-rise_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/dead/Dead (4).png"), (64, 64)))
-rise_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/dead/Dead (3).png"), (64, 64)))
-rise_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/dead/Dead (2).png"), (64, 64)))
-rise_right_sprites_0.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/boy/dead/Dead (1).png"), (64, 64)))
-rise_left_sprites_0 = []
-for sprite in rise_right_sprites_0:
-    rise_left_sprites_0.append(pygame.transform.flip(sprite, True, False))
-
-
-#walking
-walk_right_sprites_1 = []
-walk_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/walk/Walk (1).png"), (64, 64)))
-walk_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/walk/Walk (2).png"), (64, 64)))
-walk_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/walk/Walk (3).png"), (64, 64)))
-walk_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/walk/Walk (4).png"), (64, 64)))
-walk_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/walk/Walk (5).png"), (64, 64)))
-walk_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/walk/Walk (6).png"), (64, 64)))
-walk_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/walk/Walk (7).png"), (64, 64)))
-walk_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/walk/Walk (8).png"), (64, 64)))
-walk_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/walk/Walk (9).png"), (64, 64)))
-walk_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/walk/Walk (10).png"), (64, 64)))
-walk_left_sprites_1 = []
-for sprite in walk_right_sprites_1:
-    walk_left_sprites_1.append(pygame.transform.flip(sprite, True, False))
-
-#dying
-die_right_sprites_1 = []
-die_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/dead/Dead (1).png"), (64, 64)))
-die_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/dead/Dead (2).png"), (64, 64)))
-die_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/dead/Dead (3).png"), (64, 64)))
-die_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/dead/Dead (4).png"), (64, 64)))
-die_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/dead/Dead (5).png"), (64, 64)))
-die_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/dead/Dead (6).png"), (64, 64)))
-die_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/dead/Dead (7).png"), (64, 64)))
-die_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/dead/Dead (8).png"), (64, 64)))
-die_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/dead/Dead (9).png"), (64, 64)))
-die_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/dead/Dead (10).png"), (64, 64)))
-die_left_sprites_1 = []
-for sprite in die_right_sprites_1:
-    die_left_sprites_1.append(pygame.transform.flip(sprite, True, False))
-
-#rising
-rise_right_sprites_1 = []
-rise_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/dead/Dead (10).png"), (64, 64)))
-rise_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/dead/Dead (9).png"), (64, 64)))
-rise_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/dead/Dead (8).png"), (64, 64)))
-rise_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/dead/Dead (7).png"), (64, 64)))
-rise_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/dead/Dead (6).png"), (64, 64)))
-rise_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/dead/Dead (5).png"), (64, 64)))
-rise_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/dead/Dead (4).png"), (64, 64)))
-rise_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/dead/Dead (3).png"), (64, 64)))
-rise_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/dead/Dead (2).png"), (64, 64)))
-rise_right_sprites_1.append(
-    pygame.transform.scale(pygame.image.load("assets/images/zombie/girl/dead/Dead (1).png"), (64, 64)))
-rise_left_sprites_1 = []
-for sprite in rise_right_sprites_1:
-    rise_left_sprites_1.append(pygame.transform.flip(sprite, True, False))
+#DEFINE ASSETS
+class VoiceManager:
+    """Plays every sound on a fixed pool of mixer channels
+
+    A sound that already started this frame is not started again, a sound never has more
+    than its max_voices playing at once, and when every channel is busy a sound may take
+    over (steal) the channel of the oldest lower-priority sound; otherwise it is dropped.
+    Both the once-a-frame rule and max_voices count each priority separately, so a wav
+    shared by a zombie and the player never loses the player's copy to the zombie's.
+    """
+
+    #sound priorities: the player's own sounds, game events, and zombies and rubies
+    PLAYER = 2
+    GAME = 1
+    WORLD = 0
+
+    def __init__(self, channels=16):
+        """initialize the manager and reserve its channels from the mixer"""
+        pygame.mixer.set_num_channels(channels)
+        self.channels = [pygame.mixer.Channel(i) for i in range(channels)]
+        #(sound, priority, start order) last started on each channel
+        self.voices = [None] * channels
+        self.started = set()
+        self.serial = 0
+
+        #statistics
+        self.played = 0
+        self.deduplicated = 0
+        self.limited = 0
+        self.stolen = 0
+        self.dropped = 0
+
+    def begin_frame(self):
+        """start a new frame, so every sound may play once more"""
+        self.started.clear()
+
+    def play(self, sound, priority=0, max_voices=None):
+        """play a pygame.mixer.Sound and return its channel, or None if it was not started"""
+        if (sound, priority) in self.started:
+            self.deduplicated += 1
+            return None
+        #whether or not it gets a channel, the sound is settled for this frame at this priority
+        self.started.add((sound, priority))
+
+        busy = [i for i, channel in enumerate(self.channels) if channel.get_busy()]
+        if max_voices is not None and sum(1 for i in busy if self.voices[i][:2] == (sound, priority)) >= max_voices:
+            self.limited += 1
+            return None
+
+        free = [i for i in range(len(self.channels)) if i not in busy]
+        if free:
+            index = free[0]
+        else:
+            #take the oldest voice of the lowest priority below this one
+            victims = [i for i in busy if self.voices[i][1] < priority]
+            if not victims:
+                self.dropped += 1
+                return None
+            index = min(victims, key=lambda i: (self.voices[i][1], self.voices[i][2]))
+            self.channels[index].stop()
+            self.stolen += 1
+
+        self.serial += 1
+        self.voices[index] = (sound, priority, self.serial)
+        self.channels[index].play(sound)
+        self.played += 1
+        return self.channels[index]
+
+    def playing(self):
+        """return how many channels are playing"""
+        return sum(1 for channel in self.channels if channel.get_busy())
+
+    def stats(self):
+        """return the voice statistics"""
+        return {"played": self.played,
+                "deduplicated": self.deduplicated,
+                "limited": self.limited,
+                "stolen": self.stolen,
+                "dropped": self.dropped}
+
+class GatedSound:
+    """Wraps a sound so that AssetRegistry.sound_gate, if set, can veto playing it
+
+    With a VoiceManager in AssetRegistry.voices, the sound is played through it at the
+    wrapper's priority and voice limit.
+    """
+
+    def __init__(self, sound, registry, priority=0, max_voices=None):
+        """wrap a pygame.mixer.Sound"""
+        self.sound = sound
+        self.registry = registry
+        self.priority = priority
+        self.max_voices = max_voices
+
+    def play(self, *args, **kwargs):
+        """play the sound unless the gate says no"""
+        if self.registry.sound_gate is not None and not self.registry.sound_gate(self.priority):
+            return None
+        if self.registry.voices is not None:
+            return self.registry.voices.play(self.sound, self.priority, self.max_voices)
+        return self.sound.play(*args, **kwargs)
+
+    def __getattr__(self, name):
+        """pass everything else to the sound"""
+        return getattr(self.sound, name)
+
+class SilentSound:
+    """A stand-in for pygame.mixer.Sound used when audio is disabled"""
+
+    def play(self, *args, **kwargs):
+        """do nothing"""
+        return None
+
+    def stop(self):
+        """do nothing"""
+        pass
+
+    def set_volume(self, volume):
+        """do nothing"""
+        pass
+
+class TextureAtlas:
+    """Packs many small images into a few large page surfaces
+
+    Each packed image is replaced by a subsurface of its page, so sprites still have an
+    ordinary image to blit but the pixels of every frame live in a handful of surfaces.
+    Images are placed on shelves, tallest first.
+    """
+
+    def __init__(self, page_size=(1024, 1024), padding=1):
+        """initialize an empty atlas"""
+        self.page_size = page_size
+        self.padding = padding
+        self.pages = []
+        #the page index and rect of every packed image, by key
+        self.frames = {}
+
+    def pack(self, images, convert=None):
+        """pack a dict of images and return the same keys mapped to subsurfaces of the pages
+
+        Images too big for a page are left out. convert, if given, turns a new page into the
+        display's pixel format.
+        """
+        page_width, page_height = self.page_size
+        fitting = [key for key in images
+                   if images[key].get_width() <= page_width and images[key].get_height() <= page_height]
+        fitting.sort(key=lambda key: (-images[key].get_height(), -images[key].get_width()))
+
+        #lay the images out on shelves of new pages: left to right, then a new shelf below, then a new page
+        placements = []
+        page = len(self.pages)
+        x = y = shelf_height = 0
+        for key in fitting:
+            width, height = images[key].get_size()
+            if x + width > page_width:
+                x = 0
+                y += shelf_height + self.padding
+                shelf_height = 0
+            if y + height > page_height:
+                page += 1
+                x = y = shelf_height = 0
+            placements.append((key, page, pygame.Rect(x, y, width, height)))
+            x += width + self.padding
+            shelf_height = max(shelf_height, height)
+
+        while placements and len(self.pages) <= page:
+            surface = pygame.Surface(self.page_size, pygame.SRCALPHA)
+            self.pages.append(convert(surface) if convert else surface)
+
+        packed = {}
+        for key, page, rect in placements:
+            #copy the pixels exactly (an alpha blend onto the empty page would darken soft edges)
+            self.pages[page].blit(images[key], rect, special_flags=pygame.BLEND_RGBA_MAX)
+            self.frames[key] = (page, rect)
+            packed[key] = self.pages[page].subsurface(rect)
+        return packed
+
+
+class AssetRegistry:
+    """A shared cache so every image and sound is only loaded from disk once"""
+
+    def __init__(self):
+        """initialize the registry"""
+        self.images = {}
+        #sound wrappers by path, priority and voice limit, and the loaded sounds they share by path
+        self.sounds = {}
+        self.sound_data = {}
+        #collision masks, keyed by the surface they were made from
+        self.masks = {}
+
+        #headless runs turn this off so no audio device is needed
+        self.audio_enabled = True
+        #called with the sound's priority before it plays; returning False skips it (used by the load governor)
+        self.sound_gate = None
+        #the VoiceManager sounds play through, once there is a mixer
+        self.voices = None
+
+        #where preload() keeps decoded pixels between runs (None to always decode)
+        self.disk_cache = asset_cache.CACHE_DIRECTORY
+        #threads preload() decodes on (None lets the pool pick from the CPU count)
+        self.decode_workers = None
+
+        #the pages sprite frames are packed into by pack_atlas(), unless turned off
+        self.atlas = TextureAtlas()
+        self.use_atlas = True
+
+        #cache statistics
+        self.hits = 0
+        self.misses = 0
+        self.disk_loads = 0
+
+        #shared animation clips, by frames, speed and end behaviour
+        self.clips = {}
+
+        #display format conversion statistics
+        self.converted_alpha = 0
+        self.converted_opaque = 0
+        self.unconverted = 0
+        self.conversion_time = 0
+
+        #preload statistics
+        self.preloaded = 0
+        self.preloaded_from_cache = 0
+        self.preload_time = 0
+
+    def preload(self, specs):
+        """load a list of (path, size, flip, opaque) images ahead of time; return what it took
+
+        The PNGs are decoded on a thread pool, or read from the disk cache if they were
+        decoded before, and only converted to the display format here; load_image then
+        finds every one of them in memory.
+        """
+        start = time.perf_counter()
+        wanted = [spec for spec in dict.fromkeys(specs) if spec not in self.images]
+        pixels, cached = asset_cache.load_pixels([(path, size, flip) for path, size, flip, opaque in wanted],
+                                                 self.disk_cache, self.decode_workers)
+
+        for path, size, flip, opaque in wanted:
+            image_size, data = pixels[(path, size, flip)]
+            self.images[(path, size, flip, opaque)] = self.convert(pygame.image.frombytes(data, image_size, "RGBA"),
+                                                                   opaque)
+
+        elapsed = time.perf_counter() - start
+        self.preloaded += len(wanted)
+        self.preloaded_from_cache += cached
+        self.preload_time += elapsed
+        return {"images": len(wanted), "from_cache": cached, "ms": elapsed * 1000}
+
+    def pack_atlas(self):
+        """move every loaded image with alpha into the texture atlas; return how many were packed
+
+        Cached images are replaced by subsurfaces of the atlas pages, so this should run
+        before sprites take their frames (and masks) from the registry.
+        """
+        images = {key: image for key, image in self.images.items()
+                  if not key[3] and key not in self.atlas.frames and image not in self.masks}
+        packed = self.atlas.pack(images, lambda page: self.convert(page))
+        self.images.update(packed)
+        return len(packed)
+
+    def load_image(self, path, size=None, flip=False, opaque=False):
+        """return the image at path, scaled to size and flipped horizontally if asked
+
+        Images are converted to the display's pixel format as they are loaded, keeping
+        per-pixel alpha unless opaque is True.
+        """
+        key = (path, size, flip, opaque)
+        if key in self.images:
+            self.hits += 1
+            return self.images[key]
+
+        self.misses += 1
+        if flip:
+            #flip the cached scaled variant
+            image = pygame.transform.flip(self.load_image(path, size, False, opaque), True, False)
+        elif size:
+            #scale the cached original (scaling and flipping keep its pixel format)
+            image = pygame.transform.scale(self.load_image(path, None, False, opaque), size)
+        else:
+            self.disk_loads += 1
+            image = self.convert(pygame.image.load(path), opaque)
+
+        self.images[key] = image
+        return image
+
+    def convert(self, image, opaque=False):
+        """return image in the display's pixel format, or unchanged if there is no display yet"""
+        if not pygame.display.get_surface():
+            self.unconverted += 1
+            return image
+
+        start = time.perf_counter()
+        if opaque:
+            image = image.convert()
+            self.converted_opaque += 1
+        else:
+            image = image.convert_alpha()
+            self.converted_alpha += 1
+        self.conversion_time += time.perf_counter() - start
+        return image
+
+    def conversion_report(self, samples=20, blits=200):
+        """return how many surfaces were converted and how fast they blit compared to unconverted copies"""
+        report = {"converted_alpha": self.converted_alpha,
+                  "converted_opaque": self.converted_opaque,
+                  "unconverted": self.unconverted,
+                  "conversion_ms": self.conversion_time * 1000}
+
+        surface = pygame.display.get_surface()
+        if not surface:
+            return report
+
+        #time blitting a sample of loaded sprites straight from disk and as they are cached
+        raw_time = 0
+        converted_time = 0
+        sampled = 0
+        for (path, size, flip, opaque), image in list(self.images.items()):
+            if sampled >= samples:
+                break
+            if not size:
+                continue
+            raw = pygame.transform.scale(pygame.image.load(path), size)
+            if flip:
+                raw = pygame.transform.flip(raw, True, False)
+
+            start = time.perf_counter()
+            for i in range(blits):
+                surface.blit(raw, (0, 0))
+            raw_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            for i in range(blits):
+                surface.blit(image, (0, 0))
+            converted_time += time.perf_counter() - start
+            sampled += 1
+
+        if sampled:
+            report["raw_blit_us"] = raw_time / (sampled * blits) * 1000000
+            report["converted_blit_us"] = converted_time / (sampled * blits) * 1000000
+            report["speedup"] = raw_time / converted_time if converted_time else 0
+        return report
+
+    def load_frames(self, paths, size=None, flip=False):
+        """return a list of animation frames, one per path, with each frame's mask precomputed"""
+        frames = [self.load_image(path, size, flip) for path in paths]
+        for frame in frames:
+            self.mask_for(frame)
+        return frames
+
+    def load_clip(self, paths, size, speed, flip=False, hold=False):
+        """return the animation clip of a list of frames, shared by every sprite that asks for it"""
+        key = (tuple(paths), size, flip, speed, hold)
+        if key not in self.clips:
+            self.clips[key] = AnimationClip(self.load_frames(paths, size, flip), speed, hold)
+        return self.clips[key]
+
+    def mask_for(self, image):
+        """return the collision mask of a loaded image, computing it only the first time"""
+        if image in self.masks:
+            return self.masks[image]
+
+        mask = pygame.mask.from_surface(image)
+        self.masks[image] = mask
+        return mask
+
+    def load_sound(self, path, priority=0, max_voices=None):
+        """return the sound at path, played at a VoiceManager priority with at most max_voices at once"""
+        key = (path, priority, max_voices)
+        if key in self.sounds:
+            self.hits += 1
+            return self.sounds[key]
+
+        self.misses += 1
+        if self.audio_enabled:
+            if path not in self.sound_data:
+                self.disk_loads += 1
+                self.sound_data[path] = pygame.mixer.Sound(path)
+            sound = GatedSound(self.sound_data[path], self, priority, max_voices)
+        else:
+            sound = SilentSound()
+        self.sounds[key] = sound
+        return sound
+
+    def stats(self):
+        """return the cache statistics"""
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "disk_loads": self.disk_loads,
+                "images": len(self.images),
+                "masks": len(self.masks),
+                "clips": len(self.clips),
+                "sounds": len(self.sound_data),
+                "preloaded": self.preloaded,
+                "preloaded_from_cache": self.preloaded_from_cache,
+                "preload_ms": self.preload_time * 1000}
+
+ASSETS = AssetRegistry()
+
+#Zombie animation frames, filled in by load_zombie_sprites()
+#keyed by gender (0 --> boy, 1 --> girl)
+ZOMBIE_SPRITES = {}
+
+#load in Ruby assets (shared by Ruby and RubyMaker)
+RUBY_PATHS = ["assets/images/ruby/tile" + str(i).zfill(3) + ".png" for i in range(7)]
+
+#animation frame paths, also listed by asset_specs() so they can be decoded up front
+PLAYER_PATHS = {name: ["assets/images/player/" + name + "/" + name.capitalize() + " (" + str(i) + ").png"
+                       for i in range(1, 11)]
+                for name in ["run", "idle", "jump", "attack"]}
+ZOMBIE_PATHS = [{name: ["assets/images/zombie/" + folder + "/" + name + "/" + name.capitalize() + " (" + str(i) + ").png"
+                        for i in range(1, 11)]
+                 for name in ["walk", "dead"]}
+                for folder in ["boy", "girl"]]
+PORTAL_PATHS = {color: ["assets/images/portals/" + color + "/tile" + str(i).zfill(3) + ".png" for i in range(22)]
+                for color in ["green", "purple"]}
+#keyed by tile code: 1 --> dirt, 2 --> ground, 3 --> left, 4 --> middle, 5 --> right platform
+TILE_PATHS = {code: "assets/images/tiles/Tile (" + str(code) + ").png" for code in range(1, 6)}
+
+
+def setup_display(headless=False):
+    """initialize pygame and create the display surface"""
+    global DISPLAY_SURFACE
+
+    if headless:
+        #no window and no audio device; only the modules the simulation needs
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        os.environ["SDL_AUDIODRIVER"] = "dummy"
+        pygame.display.init()
+        pygame.font.init()
+        ASSETS.audio_enabled = False
+    else:
+        pygame.init()
+        if pygame.mixer.get_init() and ASSETS.voices is None:
+            ASSETS.voices = VoiceManager()
+
+    DISPLAY_SURFACE = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+    pygame.display.set_caption("Zombie Knight!")
+    return DISPLAY_SURFACE
+
+def set_world(level_data):
+    """size the world to a compiled level"""
+    global WORLD_WIDTH, WORLD_HEIGHT, RUBY_SPAWN
+    WORLD_WIDTH = level_data["width"]
+    WORLD_HEIGHT = level_data["height"]
+    RUBY_SPAWN = level_data["ruby_spawn"]
+
+def asset_specs():
+    """return every image the game loads at startup, as (path, size, flip, opaque) for AssetRegistry.preload"""
+    specs = [("assets/images/background.png", (WINDOW_WIDTH, WINDOW_HEIGHT), False, True)]
+    frame_paths = list(PLAYER_PATHS.values()) + [paths[name] for paths in ZOMBIE_PATHS for name in paths]
+    for paths in frame_paths:
+        for flip in [False, True]:
+            specs.extend((path, (64, 64), flip, False) for path in paths)
+    for paths in PORTAL_PATHS.values():
+        specs.extend((path, (72, 72), False, False) for path in paths)
+    specs.extend((path, (64, 64), False, False) for path in RUBY_PATHS)
+    specs.extend((path, (32, 32), False, False) for path in TILE_PATHS.values())
+    specs.extend(("assets/images/player/slash.png", (32, 32), flip, False) for flip in [False, True])
+    return specs
+
+def load_zombie_sprites():
+    """load the walking, dying and rising frames for both zombie genders"""
+    for gender, paths in enumerate(ZOMBIE_PATHS):
+        walk_paths = paths["walk"]
+        dead_paths = paths["dead"]
+
+        sprites = {}
+        sprites["walk_right"] = ASSETS.load_frames(walk_paths, (64, 64))
+        sprites["walk_left"] = ASSETS.load_frames(walk_paths, (64, 64), True)
+        sprites["die_right"] = ASSETS.load_frames(dead_paths, (64, 64))
+        sprites["die_left"] = ASSETS.load_frames(dead_paths, (64, 64), True)
+        #rising is dying played backwards
+        sprites["rise_right"] = sprites["die_right"][::-1]
+        sprites["rise_left"] = sprites["die_left"][::-1]
+        ZOMBIE_SPRITES[gender] = sprites
 
 
 #DEFINE CLASSES
+class KeyboardInput:
+    """Reads the player's input from the real keyboard and event queue"""
+
+    def get_pressed(self):
+        """return the keys currently held down"""
+        return pygame.key.get_pressed()
+
+    def get_events(self):
+        """return the events since the last frame"""
+        return pygame.event.get()
+
+class HeldKeys(frozenset):
+    """A set of held keys that can be indexed like pygame.key.get_pressed()"""
+
+    def __getitem__(self, key):
+        return key in self
+
+class ScriptedInput:
+    """Feeds the player a fixed script of inputs; with no script the player stands still"""
+
+    def __init__(self, script=None):
+        """initialize the script
+
+        script maps a frame number to a (held keys, tapped keys) pair, or is an iterable
+        of (frame, held keys, tapped keys) in frame order, which is read as it is needed.
+        Held keys stay down until a later entry changes them; tapped keys send a single
+        KEYDOWN event.
+        """
+        if isinstance(script, dict):
+            script = [(frame, held, tapped) for frame, (held, tapped) in sorted(script.items())]
+        self.entries = iter(script or [])
+        self.next_entry = next(self.entries, None)
+        self.frame_count = 0
+        self.held_keys = HeldKeys()
+
+    def get_pressed(self):
+        """return the keys currently held down"""
+        return self.held_keys
+
+    def get_events(self):
+        """advance one frame and return its scripted events"""
+        #keep the real queue drained so it never fills up
+        pygame.event.pump()
+
+        self.frame_count += 1
+        events = []
+        while self.next_entry is not None and self.next_entry[0] <= self.frame_count:
+            frame, held, tapped = self.next_entry
+            self.held_keys = HeldKeys(held)
+            for key in tapped:
+                events.append(pygame.event.Event(pygame.KEYDOWN, key=key))
+            self.next_entry = next(self.entries, None)
+        return events
+
+class InputRecorder:
+    """Passes another input source through to the player and logs it to a replay.ReplayWriter.
+
+    Only the keys the game reads are kept, and only frames where the held keys change
+    or a key is tapped are logged, in the (held keys, tapped keys) form ScriptedInput
+    plays back.
+    """
+
+    #the keys the game reads
+    KEYS = [pygame.K_LEFT, pygame.K_a, pygame.K_RIGHT, pygame.K_d, pygame.K_SPACE, pygame.K_UP, pygame.K_w]
+
+    def __init__(self, controls, log):
+        """initialize the recorder"""
+        self.controls = controls
+        self.log = log
+        self.frame_count = 0
+        self.held_keys = HeldKeys()
+        #this frame's [held, tapped], logged once the frame is over
+        self.entry = None
+
+    def get_pressed(self):
+        """return the keys currently held down, logging any change"""
+        keys = self.controls.get_pressed()
+        held = HeldKeys(key for key in self.KEYS if keys[key])
+        if held != self.held_keys:
+            self.held_keys = held
+            self.current_entry()[0] = held
+        return held
+
+    def get_events(self):
+        """advance one frame and return its events, logging any tapped keys"""
+        self.flush()
+        self.frame_count += 1
+        events = self.controls.get_events()
+        for event in events:
+            if event.type == pygame.KEYDOWN and event.key in self.KEYS:
+                self.current_entry()[1].append(event.key)
+        return events
+
+    def current_entry(self):
+        """return this frame's log entry, starting it if needed"""
+        if self.entry is None:
+            self.entry = [self.held_keys, []]
+        return self.entry
+
+    def flush(self):
+        """log the current frame's entry, if anything happened"""
+        if self.entry is not None:
+            self.log.write_input(self.frame_count, self.entry[0], self.entry[1])
+            self.entry = None
+
+    def close(self, checksum=0):
+        """log the last frame and close the log"""
+        self.flush()
+        self.log.close(self.frame_count, checksum)
+
+def load_replay(path, level_path=None):
+    """open a replay log; return its settings and a ScriptedInput that streams its input
+
+    The session is played on the level it was recorded on, or on level_path if given;
+    either way the level file must be unchanged since the recording (ValueError if not).
+    """
+    reader = replay.ReplayReader(path)
+    if level_path is None:
+        level_path = reader.level_path
+    if not os.path.exists(level_path) or level.level_hash(level_path) != reader.level_hash:
+        raise ValueError(path + " was recorded on " + reader.level_path + ", and " + level_path +
+                         " is missing or not the same level")
+    return {"seed": reader.seed,
+            "horde": reader.horde,
+            "level": level_path,
+            "frames": reader.frames,
+            "checksum": reader.checksum,
+            "controls": ScriptedInput(reader.inputs())}
+
+class GridGroup(pygame.sprite.Group):
+    """A sprite group for sprites that never move, indexed by a uniform grid.
+
+    Every sprite is filed under each grid cell its rect overlaps when it is added, so
+    collide() only has to test the sprites in the cells another rect overlaps instead of
+    the whole group. The default cell size matches the 32 px tile map.
+    """
+
+    def __init__(self, *sprites, cell_size=32):
+        """initialize the grid"""
+        self.cell_size = cell_size
+        self.cells = {}
+        #insertion order, so results come back in the same order spritecollide would give
+        self.order = {}
+        self.next_order = 0
+        #cells given to add_filed() for sprites about to be added
+        self.precomputed = {}
+        super().__init__(*sprites)
+
+    def cells_for(self, rect):
+        """yield the (column, row) of every cell rect overlaps"""
+        size = self.cell_size
+        for column in range(rect.left // size, (rect.right - 1) // size + 1):
+            for row in range(rect.top // size, (rect.bottom - 1) // size + 1):
+                yield (column, row)
+
+    def add_internal(self, sprite, layer=None):
+        """add a sprite and file it under its cells"""
+        super().add_internal(sprite)
+        self.order[sprite] = self.next_order
+        self.next_order += 1
+        for cell in self.precomputed.pop(sprite, None) or self.cells_for(sprite.rect):
+            self.cells.setdefault(cell, []).append(sprite)
+
+    def add_filed(self, sprite, cells):
+        """add a sprite under cells worked out ahead of time, e.g. by a compiled level"""
+        self.precomputed[sprite] = cells
+        self.add(sprite)
+
+    def remove_internal(self, sprite):
+        """remove a sprite from the group and from its cells"""
+        super().remove_internal(sprite)
+        del self.order[sprite]
+        for cell in self.cells_for(sprite.rect):
+            self.cells[cell].remove(sprite)
+            if not self.cells[cell]:
+                del self.cells[cell]
+
+    def query(self, rect):
+        """return the sprites filed under any cell rect overlaps, in group order"""
+        found = set()
+        for cell in self.cells_for(rect):
+            if cell in self.cells:
+                found.update(self.cells[cell])
+        return sorted(found, key=self.order.get)
+
+    def collide(self, sprite, collided=None):
+        """return the sprites in this group that touch sprite, like pygame.sprite.spritecollide"""
+        if collided:
+            return [other for other in self.query(sprite.rect) if collided(sprite, other)]
+        return [other for other in self.query(sprite.rect) if sprite.rect.colliderect(other.rect)]
+
+class PortalGroup(GridGroup):
+    """The level's portals, and where each one sends whatever goes through it"""
+
+    def __init__(self, *sprites, cell_size=32):
+        """initialize the group with the destinations of the default level"""
+        self.destinations = {"split": (WINDOW_WIDTH//2, WINDOW_HEIGHT//2),
+                             "x": (86, WINDOW_WIDTH - 150),
+                             "y": (64, WINDOW_HEIGHT - 132)}
+        super().__init__(*sprites, cell_size=cell_size)
+
+    def teleport(self, position):
+        """move a position that entered a portal to the opposite one"""
+        split_x, split_y = self.destinations["split"]
+        #first determine left and right
+        if position.x > split_x:
+            position.x = self.destinations["x"][0]
+        else:
+            position.x = self.destinations["x"][1]
+        #now determine top and bottom
+        if position.y > split_y:
+            position.y = self.destinations["y"][0]
+        else:
+            position.y = self.destinations["y"][1]
+
+class DirtyRenderer:
+    """Draws a frame and pushes only the parts of the screen that changed to the display.
+
+    Every blit made through the renderer is remembered. At the start of the next frame
+    only those rects are restored from the background, and at the end of the frame only
+    the old and new rects are sent to pygame.display.update(). With full_redraw on, the
+    whole background is blitted and the whole screen updated every frame instead.
+    """
+
+    def __init__(self, surface, background=None, full_redraw=False):
+        """initialize the renderer"""
+        self.surface = surface
+        self.background = background
+        self.full_redraw = full_redraw
+        #the longest move, in pixels, that draw_group will interpolate
+        self.max_interpolation = 128
+        #the part of the world on screen (None for the whole window); sprites well outside it
+        #are skipped and the rest shifted onto the screen
+        self.view = None
+
+        #rects drawn last frame and this frame
+        self.previous_rects = []
+        self.current_rects = []
+        #the next frame must redraw everything (first frame, after a pause screen, new level)
+        self.invalidated = True
+
+    def set_background(self, background):
+        """use a new background and redraw everything next frame"""
+        self.background = background
+        self.invalidate()
+
+    def invalidate(self):
+        """redraw the whole screen next frame"""
+        self.invalidated = True
+
+    def begin_frame(self):
+        """restore the background where sprites were drawn last frame"""
+        if self.full_redraw or self.invalidated:
+            self.surface.blit(self.background, (0, 0))
+        else:
+            for rect in self.previous_rects:
+                self.surface.blit(self.background, rect, rect)
+        self.current_rects = []
+
+    def draw_group(self, group, previous=None, alpha=1.0):
+        """draw every sprite in a group that is in view
+
+        If previous maps sprites to their last positions, sprites are drawn alpha of the
+        way from there to where they are now. Jumps longer than max_interpolation (screen
+        wrap-arounds, portals) are not interpolated.
+        """
+        sprites = group.sprites()
+        offset_x = offset_y = 0
+        if self.view is not None:
+            #anything that could be interpolated onto the screen counts as in view
+            area = self.view.inflate(2 * self.max_interpolation, 2 * self.max_interpolation)
+            sprites = [sprite for sprite in sprites if area.colliderect(sprite.rect)]
+            offset_x, offset_y = self.view.topleft
+
+        if previous is None or alpha >= 1:
+            self.current_rects.extend(self.surface.blits([(sprite.image, sprite.rect.move(-offset_x, -offset_y))
+                                                          for sprite in sprites]))
+            return
+
+        blit_sequence = []
+        for sprite in sprites:
+            x, y = sprite.rect.topleft
+            old_x, old_y = previous.get(sprite, (x, y))
+            if abs(x - old_x) > self.max_interpolation or abs(y - old_y) > self.max_interpolation:
+                old_x, old_y = x, y
+            blit_sequence.append((sprite.image, (round(old_x + (x - old_x) * alpha) - offset_x,
+                                                 round(old_y + (y - old_y) * alpha) - offset_y)))
+        self.current_rects.extend(self.surface.blits(blit_sequence))
+
+    def draw_blits(self, blit_sequence):
+        """draw a sequence of (image, position) pairs"""
+        self.current_rects.extend(self.surface.blits(blit_sequence))
+
+    def draw_surface(self, image, rect):
+        """draw a single surface"""
+        self.current_rects.append(self.surface.blit(image, rect))
+
+    def end_frame(self):
+        """push the changed parts of the screen to the display"""
+        if self.full_redraw or self.invalidated:
+            pygame.display.update()
+            self.invalidated = False
+        else:
+            pygame.display.update(self.previous_rects + self.current_rects)
+        self.previous_rects = self.current_rects
+
+class Camera:
+    """Follows the player around the world and decides what is on screen"""
+
+    def __init__(self, width, height, margin=64):
+        """initialize a camera with a view of width x height"""
+        self.view = pygame.Rect(0, 0, width, height)
+        self.world = pygame.Rect(0, 0, width, height)
+        #how far outside the view sprites still count as visible
+        self.margin = margin
+
+    def set_world(self, width, height):
+        """set the size of the world the camera moves around"""
+        self.world = pygame.Rect(0, 0, width, height)
+        self.view.clamp_ip(self.world)
+
+    def follow(self, rect):
+        """center the view on rect without showing anything outside the world"""
+        self.view.center = rect.center
+        self.view.clamp_ip(self.world)
+
+    def visible_area(self):
+        """return the view plus the margin, in world coordinates"""
+        return self.view.inflate(2 * self.margin, 2 * self.margin)
+
+class ChunkedLayer:
+    """The background and static tiles of a level, pre-rendered in screen-sized chunks.
+
+    A chunk is rendered the first time it comes into view and kept, and only the chunks
+    the view overlaps are ever blitted, so a map many screens wide costs no more to draw
+    than one screen. The background image repeats across the world.
+    """
+
+    def __init__(self, background, tile_group, chunk_width=WINDOW_WIDTH, chunk_height=WINDOW_HEIGHT):
+        """file the tiles under the chunks they overlap"""
+        self.background = background
+        self.chunk_width = chunk_width
+        self.chunk_height = chunk_height
+        self.chunks = {}
+        self.tiles = {}
+        for tile in tile_group.sprites():
+            for chunk in self.chunks_for(tile.rect):
+                self.tiles.setdefault(chunk, []).append(tile)
+
+    def chunks_for(self, rect):
+        """yield the (column, row) of every chunk rect overlaps"""
+        for column in range(rect.left // self.chunk_width, (rect.right - 1) // self.chunk_width + 1):
+            for row in range(rect.top // self.chunk_height, (rect.bottom - 1) // self.chunk_height + 1):
+                yield (column, row)
+
+    def chunk(self, column, row):
+        """return a chunk's surface, rendering it the first time"""
+        if (column, row) not in self.chunks:
+            left = column * self.chunk_width
+            top = row * self.chunk_height
+            surface = pygame.Surface((self.chunk_width, self.chunk_height)).convert()
+
+            #repeat the background across the chunk
+            width, height = self.background.get_size()
+            for x in range(left - left % width, left + self.chunk_width, width):
+                for y in range(top - top % height, top + self.chunk_height, height):
+                    surface.blit(self.background, (x - left, y - top))
+
+            surface.blits([(tile.image, tile.rect.move(-left, -top)) for tile in self.tiles.get((column, row), [])])
+            self.chunks[(column, row)] = surface
+        return self.chunks[(column, row)]
+
+    def draw(self, surface, view):
+        """draw the part of the layer under view (a world rect) onto surface"""
+        for column, row in self.chunks_for(view):
+            surface.blit(self.chunk(column, row), (column * self.chunk_width - view.x, row * self.chunk_height - view.y))
+
+class SweepAndPrune:
+    """Finds overlapping rects between two lists without testing every pair.
+
+    Both lists are sorted by left edge and swept left to right; a rect is only tested
+    against rects from the other list that have started and not yet ended, so for
+    sprites spread across the screen the work grows with the overlaps rather than with
+    the product of the list sizes. Each side's started rects are kept in a heap by right
+    edge, so a rect that has ended is dropped once rather than checked again per entry.
+    """
+
+    def __init__(self):
+        """initialize the counter of rect tests"""
+        self.tests = 0
+
+    def pairs(self, rects, other_rects):
+        """return (index in rects, index in other_rects) for every overlapping pair, sorted"""
+        entries = [(rect.left, 0, index, rect) for index, rect in enumerate(rects)]
+        entries += [(rect.left, 1, index, rect) for index, rect in enumerate(other_rects)]
+        entries.sort(key=lambda entry: entry[0])
+
+        #started rects on each side by index, and a heap of (right edge, index) to expire them
+        active = ({}, {})
+        ends = ([], [])
+        found = []
+        for left, side, index, rect in entries:
+            #drop the rects on the other side that end before this one starts
+            others = active[1 - side]
+            other_ends = ends[1 - side]
+            while other_ends and other_ends[0][0] <= left:
+                del others[heapq.heappop(other_ends)[1]]
+            if others:
+                self.tests += len(others)
+                other_indices = list(others)
+                for hit in rect.collidelistall(list(others.values())):
+                    other_index = other_indices[hit]
+                    found.append((index, other_index) if side == 0 else (other_index, index))
+            active[side][index] = rect
+            heapq.heappush(ends[side], (rect.right, index))
+        found.sort()
+        return found
+
+class FixedTimestep:
+    """Turns real time into a whole number of fixed-length simulation steps.
+
+    Elapsed time is added to an accumulator and spent one step at a time, so the game
+    runs at the same speed whether frames are drawn at 30 or 144 a second. If a frame
+    falls far behind, at most max_steps are run and the rest of the backlog is dropped,
+    so a slow machine slows the game down instead of falling further behind.
+    """
+
+    def __init__(self, rate=60, max_steps=5):
+        """initialize the timestep for rate steps a second"""
+        self.step_time = 1 / rate
+        self.max_steps = max_steps
+        self.accumulator = 0
+        self.last_time = None
+        self.steps = 0
+        self.dropped_steps = 0
+
+    def reset(self):
+        """forget elapsed time, e.g. after a pause"""
+        self.accumulator = 0
+        self.last_time = None
+
+    def advance(self, now=None):
+        """add the real time since the last call and return how many steps to run"""
+        if now is None:
+            now = time.perf_counter()
+        if self.last_time is None:
+            self.last_time = now
+        self.accumulator += now - self.last_time
+        self.last_time = now
+
+        steps = int(self.accumulator / self.step_time)
+        if steps > self.max_steps:
+            self.dropped_steps += steps - self.max_steps
+            steps = self.max_steps
+            self.accumulator = 0
+        else:
+            self.accumulator -= steps * self.step_time
+        self.steps += steps
+        return steps
+
+    def alpha(self):
+        """return how far, from 0 to 1, real time is between the last step and the next"""
+        return min(self.accumulator / self.step_time, 1.0)
+
+class AnimationClip:
+    """A read-only animation shared by every sprite that plays it
+
+    A clip's position is a float frame index that moves on by speed every step; at the
+    last frame it goes back to 0, or stays on the last frame if hold is True. The
+    positions reached from a starting position are worked out once and kept, so a
+    sprite's frame can be looked up from how many steps it has been playing.
+    """
+
+    def __init__(self, frames, speed, hold=False):
+        """initialize the clip"""
+        self.frames = tuple(frames)
+        self.speed = speed
+        self.hold = hold
+        self.last = len(self.frames) - 1
+        #positions after each step until the clip ends, keyed by starting position
+        self.runs = {}
+
+    def advance(self, position):
+        """return the position one step after position, and whether the clip ended on that step"""
+        if position < self.last:
+            return position + self.speed, False
+        return (self.last if self.hold else 0), True
+
+    def run(self, start):
+        """return the position after every step from start, up to and including the step that ends the clip"""
+        if start not in self.runs:
+            positions = []
+            position, ended = self.advance(start)
+            positions.append(position)
+            while not ended:
+                position, ended = self.advance(position)
+                positions.append(position)
+            self.runs[start] = tuple(positions)
+        return self.runs[start]
+
+    def position(self, start, steps):
+        """return the position after playing steps steps from start"""
+        if steps <= 0:
+            return start
+        run = self.run(start)
+        if steps <= len(run):
+            return run[steps - 1]
+        if self.hold:
+            return self.last
+        #after ending, a looping clip plays from 0 over and over
+        loop = self.run(0)
+        return loop[(steps - len(run) - 1) % len(loop)]
+
+    def frame(self, position):
+        """return the frame shown at a position"""
+        return self.frames[int(position)]
+
+class Animation:
+    """One sprite's playback of a shared clip: which clip, when it started and from where"""
+    __slots__ = ("clip", "start_tick", "start")
+
+    def __init__(self, clip, start_tick, start=0):
+        """start playing clip from position start on tick start_tick"""
+        self.clip = clip
+        self.start_tick = start_tick
+        self.start = start
+
+    def position(self, tick):
+        """return the clip position on a tick"""
+        return self.clip.position(self.start, tick - self.start_tick)
+
+    def frame(self, tick):
+        """return the frame shown on a tick"""
+        return self.clip.frame(self.position(tick))
+
+    def ended(self, tick):
+        """return True if the clip has reached its end (at least once) by a tick"""
+        return tick - self.start_tick >= len(self.clip.run(self.start))
+
+class AnimationClock:
+    """Counts simulation steps; every Animation is timed against it"""
+
+    def __init__(self):
+        """initialize the clock"""
+        self.now = 0
+
+    def tick(self):
+        """move on one step"""
+        self.now += 1
+
+#steps simulated so far, which every sprite animation is timed against (Game.step ticks it)
+ANIMATION_CLOCK = AnimationClock()
+
+class TextCache:
+    """Caches rendered text so the HUD only renders what changed.
+
+    Fixed strings (labels, titles) are rendered once. Values are drawn from cached
+    glyphs, one per character, and a field is only rebuilt when its value changes.
+    """
+
+    def __init__(self):
+        """initialize the cache"""
+        #(font, text, color) --> rendered surface, for whole strings and single glyphs
+        self.surfaces = {}
+        #field name --> (value, composed surface)
+        self.fields = {}
+
+        #cache statistics
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color):
+        """return text rendered in font and color, rendering it only the first time"""
+        key = (font, text, color)
+        if key in self.surfaces:
+            self.hits += 1
+            return self.surfaces[key]
+
+        self.misses += 1
+        surface = font.render(text, True, color).convert_alpha()
+        self.surfaces[key] = surface
+        return surface
+
+    def render_value(self, field, font, label, value, color):
+        """return label followed by value, rebuilding the surface only when value changes"""
+        if field in self.fields and self.fields[field][0] == value:
+            self.hits += 1
+            return self.fields[field][1]
+
+        self.misses += 1
+        #put the cached label and one cached glyph per character side by side
+        pieces = [self.render(font, label, color)]
+        for character in str(value):
+            pieces.append(self.render(font, character, color))
+
+        width = sum(piece.get_width() for piece in pieces)
+        height = max(piece.get_height() for piece in pieces)
+        surface = pygame.Surface((width, height), pygame.SRCALPHA).convert_alpha()
+        x = 0
+        for piece in pieces:
+            surface.blit(piece, (x, 0))
+            x += piece.get_width()
+
+        self.fields[field] = (value, surface)
+        return surface
+
+    def stats(self):
+        """return the cache statistics"""
+        lookups = self.hits + self.misses
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0,
+                "surfaces": len(self.surfaces)}
+
+class FrameProfiler:
+    """Times each subsystem of the main loop, frame by frame"""
+
+    SECTIONS = ["update", "collisions", "draw", "hud", "flip"]
+    #frames a windowed --profile session keeps: the last ten minutes at full speed
+    WINDOW_HISTORY = 10 * 60 * FPS
+
+    def __init__(self, enabled=False, history=None):
+        """initialize the profiler; history caps how many frames are kept (None keeps them all)"""
+        self.enabled = enabled
+        self.frames = collections.deque(maxlen=history)
+        self.current = {}
+        self.started = {}
+        self.frame_start = 0
+        #whether the current frame was begun while enabled; a frame enabled partway through is not recorded
+        self.in_frame = False
+        #callables given every finished frame's timings, e.g. to stream them to a file
+        self.listeners = []
+
+    def begin_frame(self):
+        """start timing a new frame"""
+        self.in_frame = self.enabled
+        if self.enabled:
+            self.current = {}
+            self.started = {}
+            self.frame_start = time.perf_counter()
+
+    def start(self, section):
+        """start timing a section"""
+        if self.enabled:
+            self.started[section] = time.perf_counter()
+
+    def stop(self, section):
+        """stop timing a section; a section timed several times in a frame is summed"""
+        if self.enabled and section in self.started:
+            elapsed = (time.perf_counter() - self.started.pop(section)) * 1000
+            self.current[section] = self.current.get(section, 0) + elapsed
+
+    def count(self, name, value):
+        """record a count (e.g. sprites in a group) for this frame"""
+        if self.enabled:
+            self.current.setdefault("counts", {})[name] = value
+
+    def end_frame(self):
+        """finish the frame, record its timings in ms and pass them to the listeners"""
+        if self.enabled and self.in_frame:
+            self.current["total"] = (time.perf_counter() - self.frame_start) * 1000
+            self.frames.append(self.current)
+            for listener in self.listeners:
+                listener(self.current)
+
+    def add_listener(self, listener):
+        """call listener(frame) with every finished frame's timings and counts"""
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """stop calling a listener"""
+        self.listeners.remove(listener)
+
+    def reset(self, history=None):
+        """forget every recorded frame; history caps how many are kept from now on"""
+        self.frames = collections.deque(maxlen=history)
+
+    def export_csv(self, path):
+        """write one row per recorded frame: every section's ms and every count"""
+        counts = sorted(set(name for frame in self.frames for name in frame.get("counts", {})))
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["frame"] + self.SECTIONS + ["total"] + counts)
+            for number, frame in enumerate(self.frames):
+                writer.writerow([number] + [round(frame.get(section, 0), 4) for section in self.SECTIONS + ["total"]] +
+                                [frame.get("counts", {}).get(name, 0) for name in counts])
+
+    def export_json(self, path):
+        """write the summary and every recorded frame"""
+        with open(path, "w") as file:
+            json.dump({"summary": self.summary(), "frames": list(self.frames)}, file)
+
+    def percentile(self, section, percent):
+        """return the given percentile of a section's ms/frame"""
+        values = sorted(frame.get(section, 0) for frame in self.frames)
+        if not values:
+            return 0
+        index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+        return values[index]
+
+    def summary(self):
+        """return mean, p50, p90, p99 and max ms/frame for every section"""
+        summary = {}
+        for section in self.SECTIONS + ["total"]:
+            values = [frame.get(section, 0) for frame in self.frames]
+            if not values:
+                continue
+            summary[section] = {"mean": sum(values) / len(values),
+                                "p50": self.percentile(section, 50),
+                                "p90": self.percentile(section, 90),
+                                "p99": self.percentile(section, 99),
+                                "max": max(values)}
+        return summary
+
+class ProfilerOverlay:
+    """An in-game panel showing FPS, a frame-time graph, per-subsystem timings and sprite counts.
+
+    The panel reads the profiler's frames and is only re-rendered every REFRESH frames,
+    so showing it costs about one blit a frame.
+    """
+
+    #how many frames between re-renders, and how many frames the graph shows
+    REFRESH = 15
+    GRAPH_FRAMES = 120
+    #ms of frame time that fill the graph, and the frame budget line at 60 FPS
+    GRAPH_MS = 33.3
+    BUDGET_MS = 1000 / 60
+    COLORS = {"update": (80, 160, 255), "collisions": (255, 170, 40), "draw": (90, 220, 90),
+              "hud": (220, 90, 220), "flip": (240, 240, 80)}
+
+    def __init__(self, profiler, font):
+        """initialize the overlay"""
+        self.profiler = profiler
+        self.font = font
+        self.visible = False
+        #whether showing the overlay is what turned profiling on
+        self.started_profiler = False
+        self.surface = None
+        self.rect = pygame.Rect(10, 10, 0, 0)
+        self.frames_until_refresh = 0
+        self.drawn_frames = 0
+        self.refresh_time = time.perf_counter()
+        self.fps = 0
+
+    def toggle(self):
+        """show or hide the overlay; profiling is on while it is shown"""
+        self.visible = not self.visible
+        if self.visible and not self.profiler.enabled:
+            self.profiler.enabled = True
+            self.started_profiler = True
+            #keep enough frames for the graph without growing forever
+            self.profiler.reset(self.GRAPH_FRAMES)
+        elif not self.visible and self.started_profiler:
+            self.profiler.enabled = False
+            self.started_profiler = False
+
+    def draw(self, renderer):
+        """draw the overlay, re-rendering it every REFRESH frames"""
+        if not self.visible:
+            return
+        self.drawn_frames += 1
+        self.frames_until_refresh -= 1
+        if self.frames_until_refresh <= 0 or self.surface is None:
+            now = time.perf_counter()
+            self.fps = self.drawn_frames / max(now - self.refresh_time, 1e-6)
+            self.refresh_time = now
+            self.drawn_frames = 0
+            self.frames_until_refresh = self.REFRESH
+            self.render()
+        renderer.draw_surface(self.surface, self.rect)
+
+    def render(self):
+        """render the panel from the latest frames"""
+        WHITE = (255, 255, 255)
+        GREY = (160, 160, 160)
+        RED = (230, 60, 60)
+        frames = list(self.profiler.frames)[-self.GRAPH_FRAMES:]
+        recent = frames[-self.REFRESH:]
+
+        lines = [("FPS: " + str(round(self.fps)), WHITE)]
+        for section in self.profiler.SECTIONS + ["total"]:
+            average = sum(frame.get(section, 0) for frame in recent) / max(len(recent), 1)
+            lines.append((section + ": " + str(round(average, 2)) + " ms", self.COLORS.get(section, WHITE)))
+        counts = recent[-1].get("counts", {}) if recent else {}
+        for name in sorted(counts):
+            lines.append((name + ": " + str(counts[name]), GREY))
+
+        line_height = self.font.get_linesize()
+        graph_height = 60
+        width = 2 * self.GRAPH_FRAMES + 10
+        self.surface = pygame.Surface((width, len(lines) * line_height + graph_height + 15), pygame.SRCALPHA)
+        self.surface.fill((0, 0, 0, 170))
+        self.rect.size = self.surface.get_size()
+
+        #one stacked bar per frame, split by subsystem
+        bottom = graph_height + 5
+        for i, frame in enumerate(frames):
+            y = bottom
+            for section in self.profiler.SECTIONS:
+                height = frame.get(section, 0) / self.GRAPH_MS * graph_height
+                top = max(y - height, 5)
+                if y - top >= 1:
+                    pygame.draw.line(self.surface, self.COLORS[section], (5 + 2 * i, y), (5 + 2 * i, top), 2)
+                y = top
+        budget_y = bottom - self.BUDGET_MS / self.GRAPH_MS * graph_height
+        pygame.draw.line(self.surface, RED, (5, budget_y), (width - 5, budget_y))
+
+        for i, (text, color) in enumerate(lines):
+            self.surface.blit(self.font.render(text, True, color), (5, bottom + 5 + i * line_height))
+
+class LoadGovernor:
+    """Keeps frame time within budget on slow machines by shedding optional work.
+
+    It keeps a moving average of how long each frame's work takes. Over budget, it raises
+    its throttle level one step at a time (at most once every ADJUST_FRAMES frames);
+    comfortably under budget, it steps back down:
+
+        level 1: tiles and portals, which only animate, are updated every other frame
+        level 2: they are updated every fourth frame, and no more zombies spawn
+                 than were alive when the level was reached
+        level 3: at most SOUND_LIMIT zombie and ruby sounds start per simulation step;
+                 the rest are skipped, not queued (the player's sounds and game events
+                 are never held back)
+
+    The number of live zombies is also capped at max_zombies whatever the level. Every
+    change of level is kept in changes; governor_report describes them.
+    """
+
+    MAX_LEVEL = 3
+    ADJUST_FRAMES = 30
+    SOUND_LIMIT = 2
+    DECORATION_STRIDES = [1, 2, 4, 4]
+
+    def __init__(self, budget_ms=1000 / FPS, max_zombies=250, min_zombies=20):
+        """initialize the governor for a frame budget in ms"""
+        self.budget_ms = budget_ms
+        self.max_zombies = max_zombies
+        self.min_zombies = min_zombies
+        self.zombie_cap = max_zombies
+        self.level = 0
+        self.average_ms = None
+        self.frames_since_change = 0
+        self.sounds_this_step = 0
+        #(frame, level, average ms, zombie cap) every time the level changed
+        self.changes = []
+        self.frames = 0
+
+    def observe(self, frame_ms, zombie_count):
+        """record how long a frame took and adjust the throttle level"""
+        self.frames += 1
+        if self.average_ms is None:
+            self.average_ms = frame_ms
+        self.average_ms = 0.9 * self.average_ms + 0.1 * frame_ms
+
+        self.frames_since_change += 1
+        if self.frames_since_change < self.ADJUST_FRAMES:
+            return
+        if self.average_ms > 0.9 * self.budget_ms and self.level < self.MAX_LEVEL:
+            self.set_level(self.level + 1, zombie_count)
+        elif self.average_ms < 0.6 * self.budget_ms and self.level > 0:
+            self.set_level(self.level - 1, zombie_count)
+
+    def set_level(self, level, zombie_count):
+        """change the throttle level and record the change"""
+        if level >= 2 and self.level < 2:
+            self.zombie_cap = max(self.min_zombies, min(zombie_count, self.max_zombies))
+        elif level < 2:
+            self.zombie_cap = self.max_zombies
+        self.level = level
+        self.frames_since_change = 0
+        self.changes.append((self.frames, level, self.average_ms, self.zombie_cap))
+
+    def throttling(self):
+        """return whether any work is being shed"""
+        return self.level > 0
+
+    def decoration_stride(self):
+        """return how many frames apart animated tiles and portals are updated"""
+        return self.DECORATION_STRIDES[self.level]
+
+    def allow_zombie(self, zombie_count):
+        """return whether another zombie may spawn"""
+        return zombie_count < self.zombie_cap
+
+    def begin_step(self):
+        """start a new simulation step, with a fresh sound budget"""
+        self.sounds_this_step = 0
+
+    def allow_sound(self, priority=0):
+        """return whether another sound of a VoiceManager priority may start this step"""
+        if self.level < 3 or priority > VoiceManager.WORLD:
+            return True
+        self.sounds_this_step += 1
+        return self.sounds_this_step <= self.SOUND_LIMIT
+
 class Game:
     """A class to help manage gameplay"""
 
-    def __init__(self, player, zombie_group, platform_group, portal_group, bullet_group, ruby_group):
+    def __init__(self, player, zombie_group, platform_group, portal_group, bullet_group, ruby_group,
+                 main_tile_group, player_group, static_tile_group, headless=False, rng=None):
         """Initialize the game"""
         #set constant variables
         self.STARTING_ROUND_TIME = 30
         self.STARTING_ZOMBIE_CREATION_TIME = 5
+        #longest time, in ms, the paused main loop sleeps waiting for an event
+        self.PAUSE_WAIT = 500
 
         #set game values
         self.score = 0
@@ -191,16 +1414,36 @@ class Game:
         self.frame_count = 0
         self.round_time = self.STARTING_ROUND_TIME
         self.zombie_creation_time = self.STARTING_ZOMBIE_CREATION_TIME
+        self.running = True
+        #simulation steps since the game was created
+        self.steps = 0
+
+        #"playing", or "paused" while a pause screen is up
+        self.state = "playing"
+        #start the music from the top, rather than unpausing it, when the pause screen is dismissed
+        self.restart_music = False
+
+        #headless games skip pause screens and never touch the mixer
+        self.headless = headless
+
+        #every random choice in the simulation comes from here, so a seed reproduces a game
+        self.rng = rng or random.Random()
 
         #load in fonts
         self.title_font = pygame.font.Font("assets/fonts/Poultrygeist.ttf", 48)
         self.HUD_font = pygame.font.Font("assets/fonts/Pixel.ttf", 24)
+        self.hud_text = TextCache()
 
         #set sounds
-        self.lost_ruby_sound = pygame.mixer.Sound("assets/sounds/lost_ruby.wav")
-        self.ruby_pickup_sound = pygame.mixer.Sound("assets/sounds/ruby_pickup.wav")
-        pygame.mixer.music.load("assets/sounds/level_music.wav")
-        pygame.mixer.music.set_volume(0.4)
+        self.lost_ruby_sound = ASSETS.load_sound("assets/sounds/lost_ruby.wav", VoiceManager.GAME, 2)
+        self.ruby_pickup_sound = ASSETS.load_sound("assets/sounds/ruby_pickup.wav", VoiceManager.GAME, 2)
+        if not self.headless:
+            pygame.mixer.music.load("assets/sounds/level_music.wav")
+            pygame.mixer.music.set_volume(0.4)
+
+        #load in background image
+        self.background_image = ASSETS.load_image("assets/images/background.png", (WINDOW_WIDTH, WINDOW_HEIGHT),
+                                                  opaque=True)
 
         #attach groups and sprites
         self.player = player
@@ -209,6 +1452,206 @@ class Game:
         self.portal_group = portal_group
         self.bullet_group = bullet_group
         self.ruby_group = ruby_group
+        self.main_tile_group = main_tile_group
+        self.player_group = player_group
+        self.static_tile_group = static_tile_group
+
+        #draws each frame, updating only what changed on the display
+        self.renderer = DirtyRenderer(DISPLAY_SURFACE)
+
+        #the camera follows the player around worlds bigger than the window
+        self.camera = Camera(WINDOW_WIDTH, WINDOW_HEIGHT)
+        self.camera.set_world(WORLD_WIDTH, WORLD_HEIGHT)
+        #where the camera was when the view background was last drawn
+        self.view_position = None
+        #only animate tiles and portals near the view (off by default)
+        self.cull_animation = False
+
+        #the background and every tile that never changes, pre-rendered in chunks,
+        #and the part of it on screen, which the renderer restores from
+        self.static_layer = None
+        self.view_background = None
+        self.build_static_layer()
+
+        #per-subsystem frame timings, off unless someone enables them, and a panel that shows them (F3)
+        self.profiler = FrameProfiler()
+        self.overlay = ProfilerOverlay(self.profiler, pygame.font.Font("assets/fonts/Pixel.ttf", 12))
+
+        #an optional horde.Horde that replaces zombie sprites for very large hordes
+        self.horde = None
+
+        #seconds create_game took, from setting up the display to here, and what AssetRegistry.preload
+        #reported for it (see startup_report)
+        self.startup_time = 0
+        self.startup_assets = {"images": 0, "from_cache": 0, "ms": 0}
+
+        #a replay.ReplayWriter that gets a checkpoint of the game state every second, if recording
+        self.checkpoint_log = None
+
+        #finds colliding pairs for check_collisions, and counts the rect tests it made
+        self.broad_phase = SweepAndPrune()
+        self.naive_tests = 0
+
+        #an optional LoadGovernor that sheds work when frames run over budget (see enable_governor)
+        self.governor = None
+
+        #the simulation runs in fixed steps however fast frames are drawn
+        self.timestep = FixedTimestep(FPS)
+        #draw sprites between their last two step positions (off by default)
+        self.interpolate = False
+        self.previous_positions = {}
+
+    def build_static_layer(self):
+        """pre-render the background and static tiles; call again whenever the level changes"""
+        self.static_layer = ChunkedLayer(self.background_image, self.static_tile_group)
+        self.view_background = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT)).convert()
+        self.view_position = None
+        self.renderer.set_background(self.view_background)
+
+    def run_frame(self, render=True):
+        """run one simulation step and (optionally) draw it"""
+        self.profiler.begin_frame()
+        self.step()
+        if render:
+            self.render()
+        self.count_sprites()
+        self.profiler.end_frame()
+
+    def play_frame(self):
+        """run as many fixed simulation steps as real time calls for, then draw one frame"""
+        frame_start = time.perf_counter()
+        self.profiler.begin_frame()
+        for step in range(self.timestep.advance()):
+            if not self.running or self.state != "playing":
+                break
+            self.step()
+        #leave a pause screen that just went up on the display
+        if self.state == "playing":
+            self.render(self.timestep.alpha())
+        self.count_sprites()
+        self.profiler.end_frame()
+
+        if self.governor is not None:
+            self.governor.observe((time.perf_counter() - frame_start) * 1000, self.zombie_count())
+
+    def count_sprites(self):
+        """record how many sprites each group has this frame, when profiling"""
+        if self.profiler.enabled:
+            self.profiler.count("zombies", self.zombie_count())
+            self.profiler.count("rubies", len(self.ruby_group))
+            self.profiler.count("bullets", len(self.bullet_group))
+            self.profiler.count("animated tiles", len(self.main_tile_group) + len(self.portal_group))
+            self.profiler.count("pair tests", self.broad_phase.tests)
+            self.profiler.count("naive pair tests", self.naive_tests)
+            if self.governor is not None:
+                self.profiler.count("governor level", self.governor.level)
+            if ASSETS.voices is not None:
+                self.profiler.count("voices", ASSETS.voices.playing())
+                self.profiler.count("voices stolen", ASSETS.voices.stolen)
+                self.profiler.count("voices dropped", ASSETS.voices.dropped + ASSETS.voices.limited)
+
+    def step(self):
+        """advance the simulation by one fixed timestep"""
+        self.steps += 1
+        ANIMATION_CLOCK.tick()
+        if ASSETS.voices is not None:
+            ASSETS.voices.begin_frame()
+        if self.governor is not None:
+            self.governor.begin_step()
+
+        #Check to see if user wants to quit
+        for event in self.player.controls.get_events():
+            if event.type == pygame.QUIT:
+                self.running = False
+
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_SPACE:
+                    self.player.jump()
+                elif event.key == pygame.K_UP or event.key == pygame.K_w:
+                    self.player.fire()
+                elif event.key == pygame.K_F3:
+                    self.overlay.toggle()
+
+                # #rain zombies DEBUG
+                # elif event.key == pygame.K_RETURN:
+                #     self.zombie_group.add(Zombie(self.platform_group, self.portal_group, 2, 7))
+
+        #remember where everything was so frames between steps can be interpolated
+        if self.interpolate:
+            self.previous_positions = {sprite: sprite.rect.topleft for group in self.sprite_groups()
+                                       for sprite in group.sprites()}
+
+        #update our animated tiles and sprite groups
+        self.profiler.start("update")
+        for group in self.sprite_groups():
+            if group in [self.main_tile_group, self.portal_group]:
+                self.update_decorations(group)
+            else:
+                group.update()
+        if self.horde is not None:
+            self.horde.step()
+        self.profiler.stop("update")
+
+        #update game
+        self.update()
+        self.camera.follow(self.player.rect)
+
+    def render(self, alpha=1.0):
+        """draw the current state; alpha is how far the next step is, for interpolation"""
+        self.profiler.start("draw")
+
+        #when the camera moves, draw the background and static tiles now in view and redraw everything
+        view = self.camera.view
+        if view.topleft != self.view_position:
+            self.view_position = view.topleft
+            self.static_layer.draw(self.view_background, view)
+            self.renderer.invalidate()
+        self.renderer.view = view.copy()
+
+        #restore the background and static tiles
+        self.renderer.begin_frame()
+
+        #draw our animated tiles and sprite groups
+        previous = self.previous_positions if self.interpolate else None
+        for group in self.sprite_groups():
+            self.renderer.draw_group(group, previous, alpha)
+        if self.horde is not None:
+            self.renderer.draw_blits(self.horde.blits(view))
+        self.profiler.stop("draw")
+
+        #draw the HUD
+        self.profiler.start("hud")
+        self.draw()
+        self.profiler.stop("hud")
+        self.overlay.draw(self.renderer)
+
+        #update display
+        self.profiler.start("flip")
+        self.renderer.end_frame()
+        self.profiler.stop("flip")
+
+    def enable_governor(self, governor=None):
+        """throttle optional work to keep frames within budget; wall-clock dependent, so off for replays"""
+        self.governor = governor or LoadGovernor()
+        ASSETS.sound_gate = self.governor.allow_sound
+
+    def update_decorations(self, group):
+        """update tiles or portals, which only animate, skipping any the culling or the governor defers"""
+        stride = self.governor.decoration_stride() if self.governor is not None else 1
+        area = self.camera.visible_area() if self.cull_animation else None
+        if stride == 1 and area is None:
+            group.update()
+            return
+
+        #spread deferred updates across frames rather than doing them all on one
+        for index, sprite in enumerate(group.sprites()):
+            if (index + self.steps) % stride == 0 and (area is None or area.colliderect(sprite.rect)):
+                sprite.update()
+
+    def sprite_groups(self):
+        """return the groups updated and drawn every step, in drawing order"""
+        return [self.main_tile_group, self.portal_group, self.player_group,
+                self.bullet_group, self.zombie_group, self.ruby_group]
 
     def update(self):
         """update the game"""
@@ -217,9 +1660,14 @@ class Game:
         if self.frame_count % FPS == 0:
             self.round_time -= 1
             self.frame_count = 0
+            if self.checkpoint_log is not None:
+                self.checkpoint_log.write_checkpoint(self.steps, self.score, self.player.health,
+                                                     self.round_number, self.zombie_count())
         
         #do checks
+        self.profiler.start("collisions")
         self.check_collisions()
+        self.profiler.stop("collisions")
         self.add_zombie()
         self.check_round_completion()
         self.check_game_over()
@@ -230,33 +1678,33 @@ class Game:
         WHITE = (255, 255, 255)
         GREEN = (25, 200, 25)
 
-        #set text
-        score_text = self.HUD_font.render("Score: " + str(self.score), True, WHITE)
+        #set text (from the text cache, so unchanged values are not rendered again)
+        score_text = self.hud_text.render_value("score", self.HUD_font, "Score: ", self.score, WHITE)
         score_rect = score_text.get_rect()
         score_rect.topleft = (10, WINDOW_HEIGHT - 50)
 
-        health_text = self.HUD_font.render("Health: " + str(self.player.health), True, WHITE)
+        health_text = self.hud_text.render_value("health", self.HUD_font, "Health: ", self.player.health, WHITE)
         health_rect = health_text.get_rect()
         health_rect.topleft = (10, WINDOW_HEIGHT - 25)
 
-        title_text = self.title_font.render("Zombie Knight", True, GREEN)
+        title_text = self.hud_text.render(self.title_font, "Zombie Knight", GREEN)
         title_rect = title_text.get_rect()
         title_rect.center = (WINDOW_WIDTH // 2, WINDOW_HEIGHT - 25)
 
-        round_text = self.HUD_font.render("Night: " + str(self.round_number), True, WHITE)
+        round_text = self.hud_text.render_value("round", self.HUD_font, "Night: ", self.round_number, WHITE)
         round_rect = round_text.get_rect()
         round_rect.topright = (WINDOW_WIDTH - 10, WINDOW_HEIGHT - 50)
 
-        time_text = self.HUD_font.render("Sunrise in: " + str(self.round_time), True, WHITE)
+        time_text = self.hud_text.render_value("time", self.HUD_font, "Sunrise in: ", self.round_time, WHITE)
         time_rect = time_text.get_rect()
         time_rect.topright = (WINDOW_WIDTH - 10, WINDOW_HEIGHT - 25)
 
         #draw the HUD
-        DISPLAY_SURFACE.blit(score_text, score_rect)
-        DISPLAY_SURFACE.blit(health_text, health_rect)
-        DISPLAY_SURFACE.blit(title_text, title_rect)
-        DISPLAY_SURFACE.blit(round_text, round_rect)
-        DISPLAY_SURFACE.blit(time_text, time_rect)
+        self.renderer.draw_surface(score_text, score_rect)
+        self.renderer.draw_surface(health_text, health_rect)
+        self.renderer.draw_surface(title_text, title_rect)
+        self.renderer.draw_surface(round_text, round_rect)
+        self.renderer.draw_surface(time_text, time_rect)
 
 
     def add_zombie(self):
@@ -265,51 +1713,136 @@ class Game:
         if self.frame_count % FPS == 0:
             #only add a zombie if zombie creation time has passed
             if self.round_time % self.zombie_creation_time == 0:
-                self.zombie_group.add(Zombie(self.platform_group, self.portal_group, self.round_number, 5 + self.round_number))
+                self.spawn_zombie()
+
+    def spawn_zombie(self):
+        """add a zombie to the horde engine if there is one, or as a sprite"""
+        if self.governor is not None and not self.governor.allow_zombie(self.zombie_count()):
+            return
+        if self.horde is not None:
+            self.horde.spawn(1, self.round_number, 5 + self.round_number)
+        else:
+            self.zombie_group.add(ZOMBIE_POOL.acquire(self.platform_group, self.portal_group, self.round_number,
+                                                      5 + self.round_number, self.rng))
 
     def check_collisions(self):
-        """Check collisions that affect gameplay"""
+        """Check collisions that affect gameplay
+
+        Bullets against zombies and zombies against rubies are found with a sweep over
+        rects sorted by their left edge, and the player is tested against whole groups in
+        one collidelistall call. Bullets are tested along the path they moved this step,
+        so they cannot skip past a zombie.
+        """
+        self.broad_phase.tests = 0
+
         #see if any bullet hit any zombie
-        collision_dict = pygame.sprite.groupcollide(self.bullet_group, self.zombie_group, True, False)
-        if collision_dict:
-            for zombies in collision_dict.values():
-                for zombie in zombies:
-                    zombie.hit_sound.play()
-                    zombie.is_dead = True
-                    zombie.animate_death = True
+        bullets = self.bullet_group.sprites()
+        zombies = self.zombie_group.sprites()
+        hits = self.broad_phase.pairs([bullet.swept_rect() for bullet in bullets], [zombie.rect for zombie in zombies])
+        for bullet_index, zombie_index in hits:
+            zombie = zombies[zombie_index]
+            zombie.hit_sound.play()
+            zombie.die()
+            bullets[bullet_index].kill()
 
         #check for collisions between player and zombie
-        collision_list = pygame.sprite.spritecollide(self.player, self.zombie_group, False)
-        if collision_list:
-            for zombie in collision_list:
-                if zombie.is_dead:
-                    #kill the zombie
-                    zombie.kick_sound.play()
-                    zombie.kill()
-                    self.score += 25
-                    self.ruby_group.add(Ruby(self.platform_group, self.portal_group))
-                else:
-                    #take damage
-                    self.player.health -= 20
-                    self.player.hit_sound.play()
-                    #move the player to not continually take damage
-                    self.player.position.x -= 256 * zombie.direction
-                    self.player.rect.bottomleft = self.player.position
+        for zombie_index in self.player.rect.collidelistall([zombie.rect for zombie in zombies]):
+            zombie = zombies[zombie_index]
+            if zombie.is_dead:
+                #kill the zombie
+                zombie.kick_sound.play()
+                zombie.kill()
+                self.score += 25
+                self.ruby_group.add(RUBY_POOL.acquire(self.platform_group, self.portal_group, self.rng))
+            else:
+                #take damage
+                self.player.health -= 20
+                self.player.hit_sound.play()
+                #move the player to not continually take damage
+                self.player.position.x -= 256 * zombie.direction
+                self.player.rect.bottomleft = self.player.position
+        self.broad_phase.tests += len(zombies)
 
         #see if a player collided with a ruby
-        if pygame.sprite.spritecollide(self.player, self.ruby_group, True):
+        rubies = self.ruby_group.sprites()
+        picked_up = self.player.rect.collidelistall([ruby.rect for ruby in rubies])
+        self.broad_phase.tests += len(rubies)
+        if picked_up:
+            for ruby_index in picked_up:
+                rubies[ruby_index].kill()
             self.ruby_pickup_sound.play()
             self.score += 100
             self.player.health += 10
             if self.player.health > self.player.STARTING_HEALTH:
                 self.player.health = self.player.STARTING_HEALTH
-        
-        #see if a living zombie collided with a ruby
-        for zombie in self.zombie_group:
-            if not zombie.is_dead:
-                if pygame.sprite.spritecollide(zombie, self.ruby_group, True):
-                    self.lost_ruby_sound.play()
-                    self.zombie_group.add(Zombie(self.platform_group, self.portal_group, self.round_number, 5+self.round_number))
+
+        #see if a living zombie collided with a ruby; a ruby is only stolen once
+        living = [zombie for zombie in self.zombie_group.sprites() if not zombie.is_dead]
+        rubies = self.ruby_group.sprites()
+        stolen = {}
+        for zombie_index, ruby_index in self.broad_phase.pairs([zombie.rect for zombie in living],
+                                                               [ruby.rect for ruby in rubies]):
+            stolen.setdefault(zombie_index, []).append(rubies[ruby_index])
+        for zombie_index in sorted(stolen):
+            taken = [ruby for ruby in stolen[zombie_index] if ruby.alive()]
+            if taken:
+                for ruby in taken:
+                    ruby.kill()
+                self.lost_ruby_sound.play()
+                self.spawn_zombie()
+
+        #what the same checks would cost testing every pair
+        self.naive_tests = len(bullets) * len(zombies) + len(zombies) + len(rubies) + len(living) * len(rubies)
+
+        if self.horde is not None:
+            self.check_horde_collisions()
+
+    def check_horde_collisions(self):
+        """Check the same gameplay collisions against the horde engine's zombies
+
+        The horde tests each rect against every zombie in one vectorized pass, so its
+        rect tests are counted in full, the same as testing every pair.
+        """
+        #see if any bullet hit any zombie, along the path it moved this step
+        bullets = self.bullet_group.sprites()
+        tests = len(bullets) * len(self.horde)
+        for bullet in bullets:
+            if self.horde.hit(bullet.swept_rect()):
+                self.horde.hit_sound.play()
+                bullet.kill()
+
+        #check for collisions between player and zombie
+        attacker_directions = self.horde.attackers(self.player.rect)
+        tests += 2 * len(self.horde)
+        for kicked in range(self.horde.kick(self.player.rect)):
+            #the zombie was killed
+            self.horde.kick_sound.play()
+            self.score += 25
+            self.ruby_group.add(RUBY_POOL.acquire(self.platform_group, self.portal_group, self.rng))
+        for direction in attacker_directions:
+            #take damage
+            self.player.health -= 20
+            self.player.hit_sound.play()
+            #move the player to not continually take damage
+            self.player.position.x -= 256 * direction
+            self.player.rect.bottomleft = self.player.position
+
+        #see if a living zombie collided with a ruby; each ruby goes to the first zombie touching it,
+        #and each thief spawns one zombie however many rubies it took, as with zombie sprites
+        rubies = self.ruby_group.sprites()
+        tests += len(rubies) * len(self.horde)
+        stolen = {}
+        for ruby, thief in zip(rubies, self.horde.thieves([ruby.rect for ruby in rubies])):
+            if thief >= 0:
+                stolen.setdefault(thief, []).append(ruby)
+        for thief in sorted(stolen):
+            for ruby in stolen[thief]:
+                ruby.kill()
+            self.lost_ruby_sound.play()
+            self.spawn_zombie()
+
+        self.broad_phase.tests += tests
+        self.naive_tests += tests
 
     def check_round_completion(self):
         """Check if the player survived a night"""
@@ -319,7 +1852,8 @@ class Game:
     def check_game_over(self):
         """Check to see if the player lost the game"""
         if self.player.health <= 0:
-            pygame.mixer.music.stop()
+            if not self.headless:
+                pygame.mixer.music.stop()
             self.pause_game("Game Over! Final Score " + str(self.score), "Press 'Enter' to play again")
             self.reset_game()
 
@@ -335,9 +1869,7 @@ class Game:
         self.round_time = self.STARTING_ROUND_TIME
 
         #empty groups
-        self.zombie_group.empty()
-        self.ruby_group.empty()
-        self.bullet_group.empty()
+        self.clear_sprites()
 
         #reset the player
         self.player.reset()
@@ -345,9 +1877,28 @@ class Game:
         #pause the game
         self.pause_game("You survived the night!", "Press 'Enter' to continue...")
 
+    def zombie_count(self):
+        """return how many zombies there are, on either engine"""
+        if self.horde is not None:
+            return len(self.horde)
+        return len(self.zombie_group)
+
+    def state_checksum(self):
+        """return a checksum of the simulation state, to check that a replay matches its recording"""
+        state = [self.score, self.round_number, self.round_time, self.frame_count, self.player.health,
+                 tuple(self.player.position), tuple(self.player.velocity)]
+        for group in [self.zombie_group, self.ruby_group, self.bullet_group]:
+            state.extend(sprite.rect.topleft for sprite in group.sprites())
+        if self.horde is not None:
+            state.append(self.horde.position.tobytes())
+        state.append(self.rng.getstate())
+        return zlib.crc32(repr(state).encode())
+
     def pause_game(self, main_text, sub_text, version_text=None):
-        """pause the game"""
-        global running
+        """show a pause screen; the game stays paused until the user hits enter (see wait_while_paused)"""
+        #nobody is there to press enter in a headless game
+        if self.headless:
+            return
 
         pygame.mixer.music.pause()
         
@@ -377,22 +1928,47 @@ class Game:
 
         pygame.display.update()
 
-        #pause game until user hits enter or quits
-        is_paused = True
-        while is_paused:
-            for event in pygame.event.get():
-                #player wants to continue
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_RETURN:
-                        is_paused = False
-                        pygame.mixer.music.unpause()
+        #the main loop waits on events until the user hits enter or quits
+        self.state = "paused"
+
+    def wait_while_paused(self):
+        """sleep until the next event (or PAUSE_WAIT ms) and handle it; used by the main loop while paused"""
+        event = pygame.event.wait(self.PAUSE_WAIT)
+
+        #player wants to continue
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_RETURN:
+            self.resume_game()
 
-                #player wants to quit
-                if event.type == pygame.QUIT:
-                    is_paused = False
-                    running = False
-                    pygame.mixer.music.stop()
+        #player wants to quit
+        elif event.type == pygame.QUIT:
+            self.running = False
+            pygame.mixer.music.stop()
+
+        #the window was uncovered; show the pause screen again
+        elif event.type == pygame.WINDOWEXPOSED:
+            pygame.display.update()
+
+    def resume_game(self):
+        """leave the pause screen and carry on playing"""
+        self.state = "playing"
+        if self.restart_music:
+            self.restart_music = False
+            pygame.mixer.music.play(-1, 0.0)
+        else:
+            pygame.mixer.music.unpause()
 
+        #the pause screen covered everything, and the time spent paused must not be caught up
+        self.renderer.invalidate()
+        self.timestep.reset()
+
+
+    def clear_sprites(self):
+        """remove every zombie, ruby and bullet, returning them to their pools"""
+        for group in [self.zombie_group, self.ruby_group, self.bullet_group]:
+            for sprite in group.sprites():
+                sprite.kill()
+        if self.horde is not None:
+            self.horde.clear()
 
     def reset_game(self):
         """reset the game"""
@@ -408,17 +1984,19 @@ class Game:
         self.player.reset()
 
         #empty sprite groups
-        self.zombie_group.empty()
-        self.ruby_group.empty()
-        self.bullet_group.empty()
+        self.clear_sprites()
 
-        #start music
-        pygame.mixer.music.play(-1, 0.0)
+        #start music, or once the pause screen is dismissed if it is up
+        if not self.headless:
+            if self.state == "paused":
+                self.restart_music = True
+            else:
+                pygame.mixer.music.play(-1, 0.0)
 
 class Player(pygame.sprite.Sprite):
     """A class the user controls"""
 
-    def __init__(self, x, y, platform_group, portal_group, bullet_group):
+    def __init__(self, x, y, platform_group, portal_group, bullet_group, controls=None):
         """initialize the player"""
         super().__init__()
 
@@ -429,75 +2007,27 @@ class Player(pygame.sprite.Sprite):
         self.VERTICAL_JUMP_SPEED = 18 #determines how high the player can jump
         self.STARTING_HEALTH = 100
 
-        #create animation lists
-        self.move_right_sprites = []
-        self.move_left_sprites = []
-        self.idle_right_sprites = []
-        self.idle_left_sprites = []
-        self.jump_right_sprites = []
-        self.jump_left_sprites = []
-        self.attack_right_sprites = []
-        self.attack_left_sprites = []
-
-        self.move_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/run/Run (1).png"), (64,64)))
-        self.move_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/run/Run (2).png"), (64,64)))
-        self.move_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/run/Run (3).png"), (64,64)))
-        self.move_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/run/Run (4).png"), (64,64)))
-        self.move_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/run/Run (5).png"), (64,64)))
-        self.move_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/run/Run (6).png"), (64,64)))
-        self.move_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/run/Run (7).png"), (64,64)))
-        self.move_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/run/Run (8).png"), (64,64)))
-        self.move_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/run/Run (9).png"), (64,64)))
-        self.move_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/run/Run (10).png"), (64,64)))
-
-        for sprite in self.move_right_sprites:
-            self.move_left_sprites.append(pygame.transform.flip(sprite, True, False))
-
-        self.idle_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/idle/Idle (1).png"), (64,64)))
-        self.idle_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/idle/Idle (2).png"), (64,64)))
-        self.idle_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/idle/Idle (3).png"), (64,64)))
-        self.idle_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/idle/Idle (4).png"), (64,64)))
-        self.idle_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/idle/Idle (5).png"), (64,64)))
-        self.idle_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/idle/Idle (6).png"), (64,64)))
-        self.idle_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/idle/Idle (7).png"), (64,64)))
-        self.idle_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/idle/Idle (8).png"), (64,64)))
-        self.idle_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/idle/Idle (9).png"), (64,64)))
-        self.idle_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/idle/Idle (10).png"), (64,64)))
-
-        for sprite in self.idle_right_sprites:
-            self.idle_left_sprites.append(pygame.transform.flip(sprite, True, False))
-
-        self.jump_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/jump/Jump (1).png"), (64,64)))
-        self.jump_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/jump/Jump (2).png"), (64,64)))
-        self.jump_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/jump/Jump (3).png"), (64,64)))
-        self.jump_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/jump/Jump (4).png"), (64,64)))
-        self.jump_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/jump/Jump (5).png"), (64,64)))
-        self.jump_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/jump/Jump (6).png"), (64,64)))
-        self.jump_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/jump/Jump (7).png"), (64,64)))
-        self.jump_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/jump/Jump (8).png"), (64,64)))
-        self.jump_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/jump/Jump (9).png"), (64,64)))
-        self.jump_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/jump/Jump (10).png"), (64,64)))
-
-        for sprite in self.jump_right_sprites:
-            self.jump_left_sprites.append(pygame.transform.flip(sprite, True, False))
-
-        self.attack_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/attack/Attack (1).png"), (64,64)))
-        self.attack_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/attack/Attack (2).png"), (64,64)))
-        self.attack_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/attack/Attack (3).png"), (64,64)))
-        self.attack_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/attack/Attack (4).png"), (64,64)))
-        self.attack_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/attack/Attack (5).png"), (64,64)))
-        self.attack_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/attack/Attack (6).png"), (64,64)))
-        self.attack_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/attack/Attack (7).png"), (64,64)))
-        self.attack_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/attack/Attack (8).png"), (64,64)))
-        self.attack_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/attack/Attack (9).png"), (64,64)))
-        self.attack_right_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/player/attack/Attack (10).png"), (64,64)))
-
-        for sprite in self.attack_right_sprites:
-            self.attack_left_sprites.append(pygame.transform.flip(sprite, True, False))
+        #create animation clips
+        run_paths = PLAYER_PATHS["run"]
+        idle_paths = PLAYER_PATHS["idle"]
+        jump_paths = PLAYER_PATHS["jump"]
+        attack_paths = PLAYER_PATHS["attack"]
+
+        self.move_right_clip = ASSETS.load_clip(run_paths, (64, 64), 0.5)
+        self.move_left_clip = ASSETS.load_clip(run_paths, (64, 64), 0.5, True)
+        self.idle_right_clip = ASSETS.load_clip(idle_paths, (64, 64), 0.5)
+        self.idle_left_clip = ASSETS.load_clip(idle_paths, (64, 64), 0.5, True)
+        self.jump_right_clip = ASSETS.load_clip(jump_paths, (64, 64), 0.1)
+        self.jump_left_clip = ASSETS.load_clip(jump_paths, (64, 64), 0.1, True)
+        self.attack_right_clip = ASSETS.load_clip(attack_paths, (64, 64), 0.25)
+        self.attack_left_clip = ASSETS.load_clip(attack_paths, (64, 64), 0.25, True)
 
         #load image and get rect
+        #(the player's clips share one position, moved on by every clip played in a step, so
+        #the player steps it directly instead of timing it against the animation clock)
         self.current_sprite = 0
-        self.image = self.idle_right_sprites[self.current_sprite]
+        self.image = self.idle_right_clip.frame(self.current_sprite)
+        self.mask = ASSETS.mask_for(self.image)
         self.rect = self.image.get_rect()
         self.rect.bottomleft = (x, y)
 
@@ -506,15 +2036,18 @@ class Player(pygame.sprite.Sprite):
         self.portal_group = portal_group
         self.bullet_group = bullet_group
 
+        #where the player's input comes from
+        self.controls = controls if controls else KeyboardInput()
+
         #animation booleans
         self.animate_jump = False
         self.animate_fire = False
 
         #load in sounds
-        self.jump_sound = pygame.mixer.Sound("assets/sounds/jump_sound.wav")
-        self.slash_sound = pygame.mixer.Sound("assets/sounds/slash_sound.wav")
-        self.portal_sound = pygame.mixer.Sound("assets/sounds/portal_sound.wav")
-        self.hit_sound = pygame.mixer.Sound("assets/sounds/player_hit.wav")
+        self.jump_sound = ASSETS.load_sound("assets/sounds/jump_sound.wav", VoiceManager.PLAYER, 1)
+        self.slash_sound = ASSETS.load_sound("assets/sounds/slash_sound.wav", VoiceManager.PLAYER, 2)
+        self.portal_sound = ASSETS.load_sound("assets/sounds/portal_sound.wav", VoiceManager.PLAYER, 2)
+        self.hit_sound = ASSETS.load_sound("assets/sounds/player_hit.wav", VoiceManager.PLAYER, 2)
 
         #kinematics vectors
         self.position = VECTOR(x, y)
@@ -532,8 +2065,8 @@ class Player(pygame.sprite.Sprite):
         self.check_collisions()
         self.check_animations()
 
-        #update the player's mask
-        self.mask = pygame.mask.from_surface(self.image)
+        #update the player's mask (precomputed for every animation frame)
+        self.mask = ASSETS.mask_for(self.image)
 
     def move(self):
         """move the player"""
@@ -541,19 +2074,19 @@ class Player(pygame.sprite.Sprite):
         self.accel = VECTOR(0, self.VERTICAL_ACCEL)
 
         #check for key press and set horizontal acceleration
-        keys = pygame.key.get_pressed()
+        keys = self.controls.get_pressed()
         if keys[pygame.K_LEFT] or keys[pygame.K_a]:
             self.accel.x = -1 * self.HORIZONTAL_ACCEL
-            self.animate(self.move_left_sprites, 0.5)
+            self.animate(self.move_left_clip)
         elif keys[pygame.K_RIGHT] or keys[pygame.K_d]:
             self.accel.x = self.HORIZONTAL_ACCEL
-            self.animate(self.move_right_sprites, 0.5)
+            self.animate(self.move_right_clip)
         else:
             if self.velocity.x > 0:
                 #animate right
-                self.animate(self.idle_right_sprites, 0.5)
+                self.animate(self.idle_right_clip)
             else:
-                self.animate(self.idle_left_sprites, 0.5)
+                self.animate(self.idle_left_clip)
 
         #calculate new kinematics values
         self.accel.x -= self.velocity.x * self.HORIZONTAL_FRICTION
@@ -562,8 +2095,8 @@ class Player(pygame.sprite.Sprite):
 
         #update rect and add wrap-around movement
         if self.position.x < 0:
-            self.position.x = WINDOW_WIDTH
-        elif self.position.x > WINDOW_WIDTH:
+            self.position.x = WORLD_WIDTH
+        elif self.position.x > WORLD_WIDTH:
             self.position.x = 0
 
         self.rect.bottomleft = self.position
@@ -572,55 +2105,46 @@ class Player(pygame.sprite.Sprite):
         """checks for collisions with platforms and portals"""
         #collision check between player and platforms when falling
         if self.velocity.y > 0: #moving down
-            collided_platforms = pygame.sprite.spritecollide(self, self.platform_group, False, pygame.sprite.collide_mask)
+            collided_platforms = self.platform_group.collide(self, pygame.sprite.collide_mask)
             if collided_platforms:
                 self.position.y = collided_platforms[0].rect.top + 5
                 self.velocity.y = 0
 
         #collisions check between player and platforms when jumping
         if self.velocity.y < 0: #moving up
-            collided_platforms = pygame.sprite.spritecollide(self, self.platform_group, False, pygame.sprite.collide_mask)
+            collided_platforms = self.platform_group.collide(self, pygame.sprite.collide_mask)
             if collided_platforms:
                 self.velocity.y = 0
-                while pygame.sprite.spritecollide(self, self.platform_group, False):
+                while self.platform_group.collide(self):
                     self.position.y += 1
                     self.rect.bottomleft = self.position
 
         #collision check for portals
-        if pygame.sprite.spritecollide(self, self.portal_group, False):
+        if self.portal_group.collide(self):
             self.portal_sound.play()
-            #determine which portal the player should move to
-            #first determine left and right
-            if self.position.x > WINDOW_WIDTH//2:
-                self.position.x = 86
-            else:
-                self.position.x = WINDOW_WIDTH - 150
-            #now determine top and bottom
-            if self.position.y > WINDOW_HEIGHT//2:
-                self.position.y = 64
-            else:
-                self.position.y = WINDOW_HEIGHT - 132
+            #move the player to the opposite portal
+            self.portal_group.teleport(self.position)
 
     def check_animations(self):
         """check for jump or fire animations"""
         #animate the player jump
         if self.animate_jump:
             if self.velocity.x > 0:
-                self.animate(self.jump_right_sprites, 0.1)
+                self.animate(self.jump_right_clip)
             else:
-                self.animate(self.jump_left_sprites, 0.1)
+                self.animate(self.jump_left_clip)
 
         #animate the player fire
         if self.animate_fire:
             if self.velocity.x > 0:
-                self.animate(self.attack_right_sprites, 0.25)
+                self.animate(self.attack_right_clip)
             else:
-                self.animate(self.attack_left_sprites, 0.25)
+                self.animate(self.attack_left_clip)
 
     def jump(self):
         """make the player jump if on a platform"""
         #only jump if on a platform
-        if pygame.sprite.spritecollide(self, self.platform_group, False):
+        if self.platform_group.collide(self):
             self.jump_sound.play()
             self.velocity.y = -1 * self.VERTICAL_JUMP_SPEED
             self.animate_jump = True
@@ -628,7 +2152,7 @@ class Player(pygame.sprite.Sprite):
     def fire(self):
         """fire a projectile"""
         self.slash_sound.play()
-        Bullet(self.rect.centerx, self.rect.centery, self.bullet_group, self)
+        BULLET_POOL.acquire(self.rect.centerx, self.rect.centery, self.bullet_group, self)
         self.animate_fire = True
 
     def reset(self):
@@ -637,12 +2161,10 @@ class Player(pygame.sprite.Sprite):
         self.rect.bottomleft = self.position
         self.velocity = VECTOR(0, 0)
 
-    def animate(self, sprite_list, speed):
+    def animate(self, clip):
         """animate the player's actions"""
-        if self.current_sprite < len(sprite_list) - 1:
-            self.current_sprite += speed
-        else:
-            self.current_sprite = 0
+        self.current_sprite, ended = clip.advance(self.current_sprite)
+        if ended:
             #end jump animation
             if self.animate_jump:
                 self.animate_jump = False
@@ -651,67 +2173,25 @@ class Player(pygame.sprite.Sprite):
             if self.animate_fire:
                 self.animate_fire = False
 
-        self.image = sprite_list[int(self.current_sprite)]
+        self.image = clip.frame(self.current_sprite)
 
 class Portal(pygame.sprite.Sprite):
     """A class that if collided with will teleport you"""
 
-    def __init__(self, x, y, color, portal_group):
+    def __init__(self, x, y, color, portal_group, rng=random):
         """initialize the portal"""
         super().__init__()
 
-        #create a list for animation frames
-        self.portal_sprites = []
+        #create the animation clip
         if color == "green": #green portal
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/green/tile000.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/green/tile001.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/green/tile002.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/green/tile003.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/green/tile004.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/green/tile005.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/green/tile006.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/green/tile007.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/green/tile008.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/green/tile009.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/green/tile010.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/green/tile011.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/green/tile012.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/green/tile013.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/green/tile014.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/green/tile015.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/green/tile016.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/green/tile017.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/green/tile018.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/green/tile019.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/green/tile020.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/green/tile021.png"), (72,72)))
+            portal_paths = PORTAL_PATHS["green"]
         else: #purple portal
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/purple/tile000.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/purple/tile001.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/purple/tile002.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/purple/tile003.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/purple/tile004.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/purple/tile005.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/purple/tile006.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/purple/tile007.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/purple/tile008.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/purple/tile009.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/purple/tile010.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/purple/tile011.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/purple/tile012.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/purple/tile013.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/purple/tile014.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/purple/tile015.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/purple/tile016.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/purple/tile017.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/purple/tile018.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/purple/tile019.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/purple/tile020.png"), (72,72)))
-            self.portal_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/portals/purple/tile021.png"), (72,72)))
+            portal_paths = PORTAL_PATHS["purple"]
+        clip = ASSETS.load_clip(portal_paths, (72, 72), 0.2)
 
         #load an image and get a rect
-        self.current_sprite = random.randint(0, len(self.portal_sprites) - 1)
-        self.image = self.portal_sprites[self.current_sprite]
+        self.animation = Animation(clip, ANIMATION_CLOCK.now, rng.randint(0, len(clip.frames) - 1))
+        self.image = self.animation.frame(ANIMATION_CLOCK.now)
         self.rect = self.image.get_rect()
         self.rect.bottomleft = (x, y)
 
@@ -719,18 +2199,85 @@ class Portal(pygame.sprite.Sprite):
 
     def update(self):
         """update the portal"""
-        self.animate(self.portal_sprites, 0.2)
+        self.animate()
 
-    def animate(self, sprite_list, speed):
-        """animate the portal"""
-        if self.current_sprite < len(sprite_list) - 1:
-            self.current_sprite += speed
-        else:
-            self.current_sprite = 0
+    def animate(self):
+        """show the portal's frame for the current step (it may not have been updated every step)"""
+        self.image = self.animation.frame(ANIMATION_CLOCK.now)
 
-        self.image = sprite_list[int(self.current_sprite)]
+class PooledSprite(pygame.sprite.Sprite):
+    """A sprite that goes back to its SpritePool when it is killed"""
 
-class Bullet(pygame.sprite.Sprite):
+    def __init__(self):
+        """initialize the sprite"""
+        super().__init__()
+        #set by the pool that created this sprite
+        self.pool = None
+        self.in_pool = False
+
+    def kill(self):
+        """remove the sprite from all groups and return it to its pool"""
+        super().kill()
+        if self.pool:
+            self.pool.release(self)
+
+class SpritePool:
+    """Keeps killed sprites of one class so they can be reused instead of rebuilt.
+
+    acquire() takes the same arguments as the class constructor and passes them to the
+    reused sprite's reset(). Killing a pooled sprite releases it; at most cap sprites are
+    kept, the rest are left to the garbage collector.
+    """
+
+    def __init__(self, sprite_class, cap=100):
+        """initialize the pool"""
+        self.sprite_class = sprite_class
+        self.cap = cap
+        self.free = []
+
+        #pool statistics
+        self.hits = 0
+        self.allocations = 0
+        self.releases = 0
+        self.discarded = 0
+
+    def acquire(self, *args):
+        """return a sprite reset with args, reusing a released one if there is one"""
+        if self.free:
+            self.hits += 1
+            sprite = self.free.pop()
+            sprite.in_pool = False
+            sprite.reset(*args)
+        else:
+            self.allocations += 1
+            sprite = self.sprite_class(*args)
+            sprite.pool = self
+        return sprite
+
+    def release(self, sprite):
+        """take back a sprite that is no longer in use"""
+        if sprite.in_pool:
+            return
+        sprite.in_pool = True
+        self.releases += 1
+        if len(self.free) < self.cap:
+            self.free.append(sprite)
+        else:
+            self.discarded += 1
+
+    def stats(self):
+        """return the pool statistics"""
+        acquired = self.hits + self.allocations
+        return {"acquired": acquired,
+                "hits": self.hits,
+                "allocations": self.allocations,
+                "hit_rate": self.hits / acquired if acquired else 0,
+                "releases": self.releases,
+                "discarded": self.discarded,
+                "free": len(self.free),
+                "cap": self.cap}
+
+class Bullet(PooledSprite):
     """A projectile fired by the player"""
 
     def __init__(self, x, y, bullet_group, player):
@@ -738,16 +2285,21 @@ class Bullet(pygame.sprite.Sprite):
         super().__init__()
 
         #set constant variables
-        self.VELOCITY = 20
+        self.SPEED = 20
         self.RANGE = 500
 
+        self.reset(x, y, bullet_group, player)
+
+    def reset(self, x, y, bullet_group, player):
+        """(re)launch the bullet from x, y in the direction the player faces"""
         #load image and get rect
         if player.velocity.x > 0:
-            self.image = pygame.transform.scale(pygame.image.load("assets/images/player/slash.png"), (32, 32))
+            self.image = ASSETS.load_image("assets/images/player/slash.png", (32, 32))
+            self.VELOCITY = self.SPEED
         else:
-            self.image = pygame.transform.scale(pygame.transform.flip(
-                pygame.image.load("assets/images/player/slash.png"), True, False), (32, 32))
-            self.VELOCITY = -1 * self.VELOCITY
+            self.image = ASSETS.load_image("assets/images/player/slash.png", (32, 32), True)
+            self.VELOCITY = -1 * self.SPEED
+        self.mask = ASSETS.mask_for(self.image)
 
         self.rect = self.image.get_rect()
         self.rect.center = (x, y)
@@ -756,6 +2308,10 @@ class Bullet(pygame.sprite.Sprite):
 
         bullet_group.add(self)
 
+    def swept_rect(self):
+        """return the rect covering everywhere the bullet passed through this step"""
+        return self.rect.union(self.rect.move(-self.VELOCITY, 0))
+
     def update(self):
         """update the bullet"""
         self.rect.x += self.VELOCITY
@@ -763,10 +2319,10 @@ class Bullet(pygame.sprite.Sprite):
         if abs(self.rect.x - self.starting_x) > self.RANGE:
             self.kill()
 
-class Ruby(pygame.sprite.Sprite):
+class Ruby(PooledSprite):
     """A class the player must collect to earn points and health"""
 
-    def __init__(self, platform_group, portal_group):
+    def __init__(self, platform_group, portal_group, rng=random):
         """initialize the ruby"""
         super().__init__()
 
@@ -774,47 +2330,36 @@ class Ruby(pygame.sprite.Sprite):
         self.VERTICAL_ACCEL = 3 #gravity
         self.HORIZONTAL_VELOCITY = 5
 
-        #add animation frames
-        self.ruby_sprites = []
-
-        self.ruby_sprites = []
-        self.ruby_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/ruby/tile000.png"),
-                                                        (64, 64)))
-        self.ruby_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/ruby/tile001.png"),
-                                                        (64, 64)))
-        self.ruby_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/ruby/tile002.png"),
-                                                        (64, 64)))
-        self.ruby_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/ruby/tile003.png"),
-                                                        (64, 64)))
-        self.ruby_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/ruby/tile004.png"),
-                                                        (64, 64)))
-        self.ruby_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/ruby/tile005.png"),
-                                                        (64, 64)))
-        self.ruby_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/ruby/tile006.png"),
-                                                        (64, 64)))
-        
+        #add the animation clip
+        self.clip = ASSETS.load_clip(RUBY_PATHS, (64, 64), 0.25)
+
+        #load sounds
+        self.portal_sound = ASSETS.load_sound("assets/sounds/portal_sound.wav", VoiceManager.WORLD, 2)
+
+        self.reset(platform_group, portal_group, rng)
+
+    def reset(self, platform_group, portal_group, rng=random):
+        """(re)spawn the ruby at the ruby maker"""
         #load image and get rect
-        self.current_sprite = 0
-        self.image = self.ruby_sprites[self.current_sprite]
+        self.animation = Animation(self.clip, ANIMATION_CLOCK.now)
+        self.image = self.animation.frame(ANIMATION_CLOCK.now)
+        self.mask = ASSETS.mask_for(self.image)
         self.rect = self.image.get_rect()
-        self.rect.bottomleft = (WINDOW_WIDTH//2, 100)
+        self.rect.bottomleft = RUBY_SPAWN
 
         #attach sprite groups
         self.platform_group = platform_group
         self.portal_group = portal_group
 
-        #load sounds
-        self.portal_sound = pygame.mixer.Sound("assets/sounds/portal_sound.wav")
-        
         #kinematic vectors
         self.position = VECTOR(self.rect.x, self.rect.y)
-        direction = random.choice([-1, 1])
+        direction = rng.choice([-1, 1])
         self.velocity = VECTOR(direction*self.HORIZONTAL_VELOCITY, 0)
         self.accel = VECTOR(0, self.VERTICAL_ACCEL)
 
     def update(self):
         """update the ruby"""
-        self.animate(self.ruby_sprites, 0.25)
+        self.animate()
         self.move()
         self.check_collisions()
 
@@ -827,8 +2372,8 @@ class Ruby(pygame.sprite.Sprite):
 
         #update rect based on new kinematics values and add wrap-around movement
         if self.position.x < 0:
-            self.position.x = WINDOW_WIDTH
-        elif self.position.x > WINDOW_WIDTH:
+            self.position.x = WORLD_WIDTH
+        elif self.position.x > WORLD_WIDTH:
             self.position.x = 0
 
         self.rect.bottomleft = self.position
@@ -836,35 +2381,24 @@ class Ruby(pygame.sprite.Sprite):
     def check_collisions(self):
         """check for collisions with platforms and portals"""
         #collision check between ruby and platforms when falling
-        collided_platforms = pygame.sprite.spritecollide(self, self.platform_group, False)
+        collided_platforms = self.platform_group.collide(self)
         if collided_platforms:
             self.position.y = collided_platforms[0].rect.top + 1
             self.velocity.y = 0
 
         #collision check for portals
-        if pygame.sprite.spritecollide(self, self.portal_group, False):
+        if self.portal_group.collide(self):
             self.portal_sound.play()
-            #determine which portal the ruby should move to
-            #first determine left and right
-            if self.position.x > WINDOW_WIDTH//2:
-                self.position.x = 86
-            else:
-                self.position.x = WINDOW_WIDTH - 150
-            #now determine top and bottom
-            if self.position.y > WINDOW_HEIGHT//2:
-                self.position.y = 64
-            else:
-                self.position.y = WINDOW_HEIGHT - 132
-
+            #move the ruby to the opposite portal
+            self.portal_group.teleport(self.position)
 
-    def animate(self, sprite_list, speed):
-        """Animate the ruby"""
-        if self.current_sprite < len(sprite_list) - 1:
-            self.current_sprite += speed
-        else:
-            self.current_sprite = 0
 
-        self.image = sprite_list[int(self.current_sprite)]
+    def animate(self):
+        """Animate the ruby, looking up its mask only when the frame changes"""
+        image = self.animation.frame(ANIMATION_CLOCK.now)
+        if image is not self.image:
+            self.image = image
+            self.mask = ASSETS.mask_for(image)
 
 class RubyMaker(pygame.sprite.Sprite):
     """A tile that is animated. A ruby will be generated here"""
@@ -873,26 +2407,11 @@ class RubyMaker(pygame.sprite.Sprite):
         """initialize the ruby maker"""
         super().__init__()
 
-        #load animation frames
-        self.ruby_sprites = []
-        self.ruby_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/ruby/tile000.png"),
-                                                        (64, 64)))
-        self.ruby_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/ruby/tile001.png"),
-                                                        (64, 64)))
-        self.ruby_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/ruby/tile002.png"),
-                                                        (64, 64)))
-        self.ruby_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/ruby/tile003.png"),
-                                                        (64, 64)))
-        self.ruby_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/ruby/tile004.png"),
-                                                        (64, 64)))
-        self.ruby_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/ruby/tile005.png"),
-                                                        (64, 64)))
-        self.ruby_sprites.append(pygame.transform.scale(pygame.image.load("assets/images/ruby/tile006.png"),
-                                                        (64, 64)))
+        #load the animation clip (the same one rubies play)
+        self.animation = Animation(ASSETS.load_clip(RUBY_PATHS, (64, 64), 0.25), ANIMATION_CLOCK.now)
 
         #load image and get rect
-        self.current_sprite = 0
-        self.image = self.ruby_sprites[self.current_sprite]
+        self.image = self.animation.frame(ANIMATION_CLOCK.now)
         self.rect = self.image.get_rect()
         self.rect.bottomleft = (x, y)
 
@@ -902,16 +2421,11 @@ class RubyMaker(pygame.sprite.Sprite):
 
     def update(self):
         """update the ruby maker"""
-        self.animate(self.ruby_sprites, .25)
-
-    def animate(self, sprite_list, speed):
-        """animate the ruby maker"""
-        if self.current_sprite < len(sprite_list) - 1:
-            self.current_sprite += speed
-        else:
-            self.current_sprite = 0
+        self.animate()
 
-        self.image = sprite_list[int(self.current_sprite)]
+    def animate(self):
+        """show the ruby maker's frame for the current step (it may not have been updated every step)"""
+        self.image = self.animation.frame(ANIMATION_CLOCK.now)
 
 class Tile(pygame.sprite.Sprite):
     """A class to represent a tile in the display"""
@@ -919,36 +2433,45 @@ class Tile(pygame.sprite.Sprite):
     def __init__(self, x, y, image_int, main_group, sub_group=None):
         """create the tile"""
         super().__init__()
-        #load in image and add it to the subgroup
-        if image_int == 1: #dirt image
-            self.image = pygame.transform.scale(pygame.image.load("assets/images/tiles/Tile (1).png"), (32, 32))
-        elif image_int == 2: #ground platform
-            self.image = pygame.transform.scale(pygame.image.load("assets/images/tiles/Tile (2).png"), (32, 32))
-            sub_group.add(self)
-        elif image_int == 3: #left platform
-            self.image = pygame.transform.scale(pygame.image.load("assets/images/tiles/Tile (3).png"), (32, 32))
-            sub_group.add(self)
-        elif image_int == 4: #middle platform
-            self.image = pygame.transform.scale(pygame.image.load("assets/images/tiles/Tile (4).png"), (32, 32))
-            sub_group.add(self)
-        elif image_int == 5: #right platform
-            self.image = pygame.transform.scale(pygame.image.load("assets/images/tiles/Tile (5).png"), (32, 32))
+        #load in image (dirt, or a ground, left, middle or right platform)
+        self.image = ASSETS.load_image(TILE_PATHS[image_int], (32, 32))
+
+        #get the rect and position in the display surface
+        self.rect = self.image.get_rect()
+        self.rect.topleft = (x, y)
+
+        #platforms are added to the subgroup (level loading merges them into
+        #PlatformSpans for collisions instead, so it passes no subgroup)
+        if image_int in [2, 3, 4, 5] and sub_group is not None:
             sub_group.add(self)
 
         #add every tile to main group
         main_group.add(self)
 
-        #get the rect and position in the display surface
-        self.rect = self.image.get_rect()
-        self.rect.topleft = (x, y)
+class PlatformSpan(pygame.sprite.Sprite):
+    """A single collider covering a horizontal run of platform tiles. It is never drawn"""
+
+    def __init__(self, tiles, platform_group, cells=None):
+        """create the span from a left-to-right run of tiles; cells are its grid cells, if known"""
+        super().__init__()
+
+        #the rect covers the whole run
+        self.rect = tiles[0].rect.unionall([tile.rect for tile in tiles[1:]])
 
-        #create mask
-        self.mask = pygame.mask.from_surface(self.image)
+        #the mask is every tile's mask side by side
+        self.mask = pygame.mask.Mask(self.rect.size)
+        for tile in tiles:
+            self.mask.draw(pygame.mask.from_surface(tile.image), (tile.rect.x - self.rect.x, tile.rect.y - self.rect.y))
 
-class Zombie(pygame.sprite.Sprite):
+        if cells:
+            platform_group.add_filed(self, cells)
+        else:
+            platform_group.add(self)
+
+class Zombie(PooledSprite):
     """an enemy class that moves across the screen"""
 
-    def __init__(self, platform_group, portal_group, min_speed, max_speed):
+    def __init__(self, platform_group, portal_group, min_speed, max_speed, rng=random):
         """initialize the zombie"""
         super().__init__()
 
@@ -956,33 +2479,38 @@ class Zombie(pygame.sprite.Sprite):
         self.VERTICAL_ACCEL = 3 #gravity
         self.RISE_TIME = 2
 
-        #create animation frames
-        gender = random.randint(0, 1)
-        if gender == 0:
-            self.walk_right_sprites = walk_right_sprites_0
-            self.walk_left_sprites = walk_left_sprites_0
-            self.die_right_sprites = die_right_sprites_0
-            self.die_left_sprites = die_left_sprites_0
-            self.rise_right_sprites = rise_right_sprites_0
-            self.rise_left_sprites = rise_right_sprites_0
-        else:
-            self.walk_right_sprites = walk_right_sprites_1
-            self.walk_left_sprites = walk_left_sprites_1
-            self.die_right_sprites = die_right_sprites_1
-            self.die_left_sprites = die_left_sprites_1
-            self.rise_right_sprites = rise_right_sprites_1
-            self.rise_left_sprites = rise_right_sprites_1
+        #load sounds
+        self.hit_sound = ASSETS.load_sound("assets/sounds/zombie_hit.wav", VoiceManager.WORLD, 3)
+        self.kick_sound = ASSETS.load_sound("assets/sounds/zombie_kick.wav", VoiceManager.WORLD, 3)
+        self.portal_sound = ASSETS.load_sound("assets/sounds/portal_sound.wav", VoiceManager.WORLD, 2)
+
+        self.reset(platform_group, portal_group, min_speed, max_speed, rng)
+
+    def reset(self, platform_group, portal_group, min_speed, max_speed, rng=random):
+        """(re)spawn the zombie above the screen with a new look, direction and speed"""
+        #create animation clips
+        gender = rng.randint(0, 1)
+        walk_paths = ZOMBIE_PATHS[gender]["walk"]
+        dead_paths = ZOMBIE_PATHS[gender]["dead"]
+        self.walk_right_clip = ASSETS.load_clip(walk_paths, (64, 64), 0.5)
+        self.walk_left_clip = ASSETS.load_clip(walk_paths, (64, 64), 0.5, True)
+        #dying holds the last frame; rising is dying played backwards, always facing right
+        self.die_right_clip = ASSETS.load_clip(dead_paths, (64, 64), .095, hold=True)
+        self.die_left_clip = ASSETS.load_clip(dead_paths, (64, 64), .095, True, hold=True)
+        self.rise_clip = ASSETS.load_clip(dead_paths[::-1], (64, 64), .095)
 
         #load an image and get rect
-        self.direction = random.choice([-1, 1])
+        self.direction = rng.choice([-1, 1])
 
-        self.current_sprite = 0
         if self.direction == -1:
-            self.image = self.walk_left_sprites[self.current_sprite]
+            self.walk_clip = self.walk_left_clip
         else:
-            self.image = self.walk_right_sprites[self.current_sprite]
+            self.walk_clip = self.walk_right_clip
+        self.animation = Animation(self.walk_clip, ANIMATION_CLOCK.now)
+        self.image = self.animation.frame(ANIMATION_CLOCK.now)
+        self.mask = ASSETS.mask_for(self.image)
         self.rect = self.image.get_rect()
-        self.rect.bottomleft = (random.randint(100, WINDOW_WIDTH - 100), -100)
+        self.rect.bottomleft = (rng.randint(100, WORLD_WIDTH - 100), -100)
 
         #attach sprite groups
         self.platform_group = platform_group
@@ -992,14 +2520,9 @@ class Zombie(pygame.sprite.Sprite):
         self.animate_death = False
         self.animate_rise = False
 
-        #load sounds
-        self.hit_sound = pygame.mixer.Sound("assets/sounds/zombie_hit.wav")
-        self.kick_sound = pygame.mixer.Sound("assets/sounds/zombie_kick.wav")
-        self.portal_sound = pygame.mixer.Sound("assets/sounds/portal_sound.wav")
-
         #load in kinematics vectors
         self.position = VECTOR(self.rect.x, self.rect.y)
-        self.velocity = VECTOR(self.direction * random.randint(min_speed, max_speed), 0)
+        self.velocity = VECTOR(self.direction * rng.randint(min_speed, max_speed), 0)
         self.accel = VECTOR(0, self.VERTICAL_ACCEL)
 
         #set initial values
@@ -1022,17 +2545,14 @@ class Zombie(pygame.sprite.Sprite):
                 if self.round_time == self.RISE_TIME:
                     self.animate_rise = True
                     #when the zombie died, the image was kept at the last image
-                    #when it rises we want to start at index 0 of the rise_sprites list
-                    self.current_sprite = 0
+                    #when it rises we want to start at the first frame of the rise clip
+                    self.animation = Animation(self.rise_clip, ANIMATION_CLOCK.now)
 
     def move(self):
         """move the zombie"""
         if not self.is_dead:
             #animate the zombie walking
-            if self.direction == -1:
-                self.animate(self.walk_left_sprites, 0.5)
-            else:
-                self.animate(self.walk_right_sprites, 0.5)
+            self.animate()
 
             #the accel doesn't change, so we don't need to update the accel vector
             #calculate new kinematics values
@@ -1041,8 +2561,8 @@ class Zombie(pygame.sprite.Sprite):
 
             #update rect based on new kinematics values and add wrap-around movement
             if self.position.x < 0:
-                self.position.x = WINDOW_WIDTH
-            elif self.position.x > WINDOW_WIDTH:
+                self.position.x = WORLD_WIDTH
+            elif self.position.x > WORLD_WIDTH:
                 self.position.x = 0
 
             self.rect.bottomleft = self.position
@@ -1050,198 +2570,326 @@ class Zombie(pygame.sprite.Sprite):
     def check_collisions(self):
         """checks for collisions with platforms and portals"""
         #collision check between player and zombie when falling
-        collided_platforms = pygame.sprite.spritecollide(self, self.platform_group, False)
+        collided_platforms = self.platform_group.collide(self)
         if collided_platforms:
             self.position.y = collided_platforms[0].rect.top + 1
             self.velocity.y = 0
 
         #collision check for portals
-        if pygame.sprite.spritecollide(self, self.portal_group, False):
+        if self.portal_group.collide(self):
             self.portal_sound.play()
-            #determine which portal the zombie should move to
-            #first determine left and right
-            if self.position.x > WINDOW_WIDTH//2:
-                self.position.x = 86
-            else:
-                self.position.x = WINDOW_WIDTH - 150
-            #now determine top and bottom
-            if self.position.y > WINDOW_HEIGHT//2:
-                self.position.y = 64
-            else:
-                self.position.y = WINDOW_HEIGHT - 132
+            #move the zombie to the opposite portal
+            self.portal_group.teleport(self.position)
 
     def check_animations(self):
         """check for death animation"""
-        #animate the zombie death
+        #animate the zombie death, which ends holding its last frame
         if self.animate_death:
-            if self.direction == 1:
-                self.animate(self.die_right_sprites, .095)
-            else:
-                self.animate(self.die_left_sprites, .095)
-
-        #animate the zombie rise
-        if self.animate_rise:
-            if self.direction == 1:
-                self.animate(self.rise_right_sprites, .095)
-            else:
-                self.animate(self.rise_left_sprites, .095)
-        
-
-    def animate(self, sprite_list, speed):
-        """animate the zombie's actions"""
-        if self.current_sprite < len(sprite_list) - 1:
-            self.current_sprite += speed
-        else:
-            self.current_sprite = 0
-
-            #end death animation
-            if self.animate_death:
-                self.current_sprite = len(sprite_list) - 1
+            self.animate()
+            if self.animation.ended(ANIMATION_CLOCK.now):
                 self.animate_death = False
 
-            #end rise animation
-            if self.animate_rise:
+        #animate the zombie rise, and walk again once it ends
+        if self.animate_rise:
+            self.animate()
+            if self.animation.ended(ANIMATION_CLOCK.now):
                 self.animate_rise = False
                 self.is_dead = False
                 self.frame_count = 0
                 self.round_time = 0
+                self.animation = Animation(self.walk_clip, ANIMATION_CLOCK.now)
+
+    def die(self):
+        """kill the zombie; its death animation carries on from the walking frame it was on"""
+        self.is_dead = True
+        self.animate_death = True
+        if self.direction == 1:
+            clip = self.die_right_clip
+        else:
+            clip = self.die_left_clip
+        self.animation = Animation(clip, ANIMATION_CLOCK.now, self.animation.position(ANIMATION_CLOCK.now))
+
+    def animate(self):
+        """show the zombie's frame for the current step, looking up its mask only when the frame changes"""
+        image = self.animation.frame(ANIMATION_CLOCK.now)
+        if image is not self.image:
+            self.image = image
+            self.mask = ASSETS.mask_for(image)
+
+#Create sprite pools so bullets, rubies and zombies are reused instead of rebuilt
+#caps can be changed at any time through each pool's cap attribute
+BULLET_POOL = SpritePool(Bullet, 32)
+RUBY_POOL = SpritePool(Ruby, 64)
+ZOMBIE_POOL = SpritePool(Zombie, 256)
+
+def pool_stats():
+    """return the statistics of every sprite pool"""
+    return {"bullet": BULLET_POOL.stats(),
+            "ruby": RUBY_POOL.stats(),
+            "zombie": ZOMBIE_POOL.stats()}
+
+#the level played unless another is given
+DEFAULT_LEVEL = "levels/level1.txt"
+
+#generate tile objects from a compiled level
+def build_level(level_data, main_tile_group, static_tile_group, platform_group, portal_group, player_group, bullet_group,
+                controls=None, rng=random):
+    """create the tiles, colliders, portals and player of a compiled level (see level.py) and return the player
+
+    Tiles that never change go in static_tile_group; animated ones go in main_tile_group.
+    """
+    #dirt and platform tiles
+    tiles = {}
+    for x, y, code in level_data["tiles"]:
+        tiles[(x, y)] = Tile(x, y, code, static_tile_group)
+
+    for x, y in level_data["ruby_makers"]:
+        RubyMaker(x, y, main_tile_group)
+
+    portal_group.destinations = level_data["portal_table"]
+    for x, y, color in level_data["portals"]:
+        Portal(x, y, color, portal_group, rng)
+
+    #one collider per run of platform tiles, filed under the grid cells the level compiled for it
+    #(the tiles themselves are only drawn)
+    use_grid = platform_group.cell_size == level.TILE_SIZE
+    cells = {}
+    for cell, indices in level_data["grid"].items():
+        for index in indices:
+            cells.setdefault(index, []).append(cell)
+    for index, (x, y, count) in enumerate(level_data["platforms"]):
+        run = [tiles[(x + k * level.TILE_SIZE, y)] for k in range(count)]
+        PlatformSpan(run, platform_group, cells.get(index) if use_grid else None)
+
+    x, y = level_data["player"]
+    player = Player(x, y, platform_group, portal_group, bullet_group, controls)
+    player_group.add(player)
+    return player
+
+def create_game(headless=False, controls=None, seed=None, level_path=DEFAULT_LEVEL):
+    """set up pygame, build the level and return a new game; the same seed and input replay the same game"""
+    start = time.perf_counter()
+    setup_display(headless)
+    rng = random.Random(seed)
+
+    #decode every image up front, in parallel or from the disk cache
+    preloaded = ASSETS.preload(asset_specs())
+    #and pack the sprite frames into a few large surfaces
+    if ASSETS.use_atlas:
+        ASSETS.pack_atlas()
+
+    #Create Sprite Groups
+    my_main_tile_group = pygame.sprite.Group()
+    my_static_tile_group = pygame.sprite.Group()
+    #platforms and portals never move, so they are indexed by a grid for collisions
+    my_platform_group = GridGroup()
+
+    my_player_group = pygame.sprite.Group()
+    my_bullet_group = pygame.sprite.Group()
+
+    my_zombie_group = pygame.sprite.Group()
+
+    my_portal_group = PortalGroup()
+    my_ruby_group = pygame.sprite.Group()
+
+    #headless games have nobody at the keyboard
+    if headless and not controls:
+        controls = ScriptedInput()
+
+    level_data = level.load_level(level_path)
+    set_world(level_data)
+    my_player = build_level(level_data, my_main_tile_group, my_static_tile_group, my_platform_group, my_portal_group,
+                            my_player_group, my_bullet_group, controls, rng)
+
+    #create a game
+    my_game = Game(my_player, my_zombie_group, my_platform_group, my_portal_group, my_bullet_group, my_ruby_group,
+                   my_main_tile_group, my_player_group, my_static_tile_group, headless, rng)
+    my_game.startup_time = time.perf_counter() - start
+    my_game.startup_assets = preloaded
+    return my_game
+
+def startup_report(game):
+    """return a line describing how long a game took to start and where its images came from"""
+    assets = game.startup_assets
+    return ("Started in " + str(round(game.startup_time * 1000)) + "ms: " + str(assets["images"]) + " images in " +
+            str(round(assets["ms"])) + "ms (" + str(assets["from_cache"]) + " from the disk cache, " +
+            str(assets["images"] - assets["from_cache"]) + " decoded), " + str(len(ASSETS.atlas.frames)) +
+            " frames in " + str(len(ASSETS.atlas.pages)) + " atlas pages")
+
+def governor_report(governor):
+    """return a line for every change of a load governor's level"""
+    lines = []
+    for frame, throttle_level, average_ms, zombie_cap in governor.changes:
+        lines.append("Load governor: level " + str(throttle_level) + " at frame " + str(frame) + " (" +
+                     str(round(average_ms, 1)) + " ms/frame against " + str(round(governor.budget_ms, 1)) +
+                     ", zombie cap " + str(zombie_cap) + ")")
+    return "\n".join(lines)
+
+def use_horde(game):
+    """switch a game's zombies to the NumPy horde engine (needs numpy)"""
+    import horde
+    if not ZOMBIE_SPRITES:
+        load_zombie_sprites()
+    #the same sounds, priority and voice limits as Zombie
+    sounds = {"hit": ASSETS.load_sound("assets/sounds/zombie_hit.wav", VoiceManager.WORLD, 3),
+              "kick": ASSETS.load_sound("assets/sounds/zombie_kick.wav", VoiceManager.WORLD, 3),
+              "portal": ASSETS.load_sound("assets/sounds/portal_sound.wav", VoiceManager.WORLD, 2)}
+    game.clear_sprites()
+    game.horde = horde.Horde(game.platform_group, game.portal_group, (WORLD_WIDTH, WORLD_HEIGHT), ZOMBIE_SPRITES,
+                             sounds, FPS, game.rng.getrandbits(32))
+
+def run_headless(frames=None, nights=1, controls=None, render=False, full_redraw=False, use_horde_engine=False,
+                 seed=None, level_path=DEFAULT_LEVEL, profile=False):
+    """simulate gameplay with no window, no audio and no frame cap; return the game
+
+    Runs for the given number of frames, or for that many nights of game time if frames is None.
+    """
+    my_game = create_game(True, controls, seed, level_path)
+    my_game.renderer.full_redraw = full_redraw
+    my_game.profiler.enabled = profile
+    if use_horde_engine:
+        use_horde(my_game)
+    my_game.reset_game()
+
+    if frames is None:
+        frames = nights * my_game.STARTING_ROUND_TIME * FPS
+    my_game.frames_simulated = 0
+
+    for frame in range(frames):
+        if not my_game.running:
+            break
+        my_game.run_frame(render)
+        my_game.frames_simulated += 1
+
+    return my_game
+
+def main():
+    """play the game, or soak-test it headless"""
+    parser = argparse.ArgumentParser(description="Zombie Knight!")
+    parser.add_argument("--headless", action="store_true", help="simulate with no window, audio or frame cap")
+    parser.add_argument("--nights", type=int, default=1, help="nights of game time to simulate when headless")
+    parser.add_argument("--render", action="store_true", help="still draw each frame when headless")
+    parser.add_argument("--full-redraw", action="store_true", help="redraw the whole screen every frame")
+    parser.add_argument("--horde", action="store_true", help="run zombies on the NumPy horde engine")
+    parser.add_argument("--max-fps", type=int, default=FPS, help="cap on frames drawn a second (0 for no cap)")
+    parser.add_argument("--interpolate", action="store_true", help="draw sprites between simulation steps")
+    parser.add_argument("--cull-animation", action="store_true", help="only animate tiles and portals near the view")
+    parser.add_argument("--level", help="level file to play (replays default to the level they were recorded on)")
+    parser.add_argument("--seed", type=int, help="seed the game's random numbers")
+    parser.add_argument("--record", help="save the session's input to this file for replaying")
+    parser.add_argument("--replay", help="re-simulate a recorded session headless")
+    parser.add_argument("--governor", action="store_true",
+                        help="shed optional work (animation, spawns, sounds) when frames run over budget")
+    parser.add_argument("--overlay", action="store_true", help="start with the profiler overlay shown (F3 toggles it)")
+    parser.add_argument("--profile", help="save per-frame timings and sprite counts to this .csv or .json file")
+    parser.add_argument("--asset-report", action="store_true",
+                        help="report how many surfaces were converted and how fast they blit")
+    parser.add_argument("--no-asset-cache", action="store_true",
+                        help="decode every image instead of reading the decoded pixels cached on disk")
+    parser.add_argument("--no-atlas", action="store_true",
+                        help="keep every sprite frame in its own surface instead of packing them into an atlas")
+    args = parser.parse_args()
+
+    level_path = args.level or DEFAULT_LEVEL
+    if args.no_asset_cache:
+        ASSETS.disk_cache = None
+    if args.no_atlas:
+        ASSETS.use_atlas = False
+
+    if args.asset_report:
+        print(startup_report(create_game(args.headless, level_path=level_path)))
+        report = ASSETS.conversion_report()
+        print("Converted " + str(report["converted_alpha"]) + " surfaces with alpha and " +
+              str(report["converted_opaque"]) + " opaque in " + str(round(report["conversion_ms"], 1)) + "ms (" +
+              str(report["unconverted"]) + " left unconverted)")
+        if "speedup" in report:
+            print("Blit: " + str(round(report["raw_blit_us"], 2)) + "us unconverted, " +
+                  str(round(report["converted_blit_us"], 2)) + "us converted (" +
+                  str(round(report["speedup"], 1)) + "x faster)")
+
+    if args.replay:
+        try:
+            session = load_replay(args.replay, args.level)
+        except ValueError as error:
+            parser.error(str(error))
+        start = time.perf_counter()
+        my_game = run_headless(session["frames"], controls=session["controls"], render=args.render,
+                               use_horde_engine=session["horde"], seed=session["seed"], level_path=session["level"],
+                               profile=bool(args.profile))
+        elapsed = time.perf_counter() - start
+        frames = my_game.frames_simulated
+        print(startup_report(my_game))
+        print("Replayed " + str(frames) + " frames in " + str(round(elapsed, 2)) + "s (" +
+              str(round(frames / elapsed)) + " frames/s), score " + str(my_game.score) +
+              ", night " + str(my_game.round_number))
+        if session["checksum"]:
+            matched = my_game.state_checksum() == session["checksum"]
+            print("Final state " + ("matches" if matched else "DOES NOT match") + " the recording")
+    elif args.headless:
+        start = time.perf_counter()
+        my_game = run_headless(nights=args.nights, render=args.render, full_redraw=args.full_redraw,
+                               use_horde_engine=args.horde, seed=args.seed, level_path=level_path,
+                               profile=bool(args.profile))
+        elapsed = time.perf_counter() - start
+        frames = my_game.frames_simulated
+        print(startup_report(my_game))
+        print("Simulated " + str(frames) + " frames in " + str(round(elapsed, 2)) + "s (" +
+              str(round(frames / elapsed)) + " frames/s), score " + str(my_game.score) +
+              ", night " + str(my_game.round_number))
+    else:
+        #without a seed, pick one so a recording can still be replayed
+        seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+        controls = None
+        if args.record:
+            controls = InputRecorder(KeyboardInput(), replay.ReplayWriter(args.record, seed, InputRecorder.KEYS,
+                                                                          args.horde, level_path,
+                                                                          level.level_hash(level_path)))
+        my_game = create_game(controls=controls, seed=seed, level_path=level_path)
+        print(startup_report(my_game))
+        if args.record:
+            my_game.checkpoint_log = controls.log
+        my_game.renderer.full_redraw = args.full_redraw
+        my_game.interpolate = args.interpolate
+        my_game.cull_animation = args.cull_animation
+        my_game.profiler.enabled = bool(args.profile)
+        if args.profile:
+            #a windowed session can run for hours, so only the most recent frames are kept
+            my_game.profiler.reset(FrameProfiler.WINDOW_HISTORY)
+        if args.governor:
+            if args.record:
+                print("--governor is ignored when recording, since it would make the replay differ")
+            else:
+                my_game.enable_governor()
+        if args.overlay:
+            my_game.overlay.toggle()
+        if args.horde:
+            use_horde(my_game)
+        my_game.pause_game("Zombie Knight!", "Press 'Enter' to begin", "v1.0.2")
+        my_game.restart_music = True
+
+        """MAIN GAME LOOP"""
+        while my_game.running:
+            if my_game.state == "paused":
+                #sleep on the event queue instead of spinning
+                my_game.wait_while_paused()
+            else:
+                my_game.play_frame()
+                #tick clock (the simulation rate does not depend on this)
+                CLOCK.tick(args.max_fps)
+
+        if args.record:
+            controls.close(my_game.state_checksum())
+        if my_game.governor is not None and my_game.governor.changes:
+            print(governor_report(my_game.governor))
+
+    if args.profile:
+        if args.profile.endswith(".json"):
+            my_game.profiler.export_json(args.profile)
+        else:
+            my_game.profiler.export_csv(args.profile)
+
+    #end the game
+    pygame.quit()
 
-        self.image = sprite_list[int(self.current_sprite)]
-
-#Create Sprite Groups
-my_main_tile_group = pygame.sprite.Group()
-my_platform_group = pygame.sprite.Group()
-
-my_player_group = pygame.sprite.Group()
-my_bullet_group = pygame.sprite.Group()
-
-my_zombie_group = pygame.sprite.Group()
-
-my_portal_group = pygame.sprite.Group()
-my_ruby_group = pygame.sprite.Group()
-
-#Create the tile map
-#0 --> no tile, 1 --> dirt tile, 2-5 --> platforms, 6 --> ruby maker, 7-8 --> portals, 9 --> player
-#23 rows and 40 columns
-tile_map = [
-[0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-[0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-[7, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 8, 0],
-[4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 5, 0, 0, 0, 0, 6, 0, 0, 0, 0, 0, 3, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4],
-[0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-[0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-[0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-[0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-[0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 3, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 5, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-[0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-[4, 4, 4, 4, 4, 5, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 3, 4, 4, 4, 4, 4],
-[0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-[0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-[0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-[0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-[4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 5, 0, 0, 0, 0, 0, 0, 0, 0, 3, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4],
-[0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-[0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 9, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-[0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 3, 4, 4, 5, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-[0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-[8, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 7, 0],
-[2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2],
-[1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1]
-]
-
-#generate tile objects from tile map
-#loop through the 23 rows in the map, i moves us down the map
-for i in range(len(tile_map)):
-    #loop through the 40 columns in a given row, j moves us across the map
-    for j in range(len(tile_map[i])):
-        #dirt tile
-        if tile_map[i][j] == 1:
-            Tile(j * 32, i * 32, 1, my_main_tile_group)
-        #ground platform tile
-        elif tile_map[i][j] == 2:
-            Tile(j * 32, i * 32, 2, my_main_tile_group, my_platform_group)
-        #left platform tile
-        elif tile_map[i][j] == 3:
-            Tile(j * 32, i * 32, 3, my_main_tile_group, my_platform_group)
-        #middle platform tile
-        elif tile_map[i][j] == 4:
-            Tile(j * 32, i * 32, 4, my_main_tile_group, my_platform_group)
-        #right platform tile
-        elif tile_map[i][j] == 5:
-            Tile(j * 32, i * 32, 5, my_main_tile_group, my_platform_group)
-        #ruby maker
-        elif tile_map[i][j] == 6:
-            RubyMaker(j * 32, i * 32, my_main_tile_group)
-        #portals
-        elif tile_map[i][j] == 7:
-            Portal(j * 32, i * 32, "green", my_portal_group)
-        elif tile_map[i][j] == 8:
-            Portal(j * 32, i * 32, "purple", my_portal_group)
-        #player
-        elif tile_map[i][j] == 9:
-            my_player = Player(j * 32 - 32, i * 32 + 32, my_platform_group, my_portal_group, my_bullet_group)
-            my_player_group.add(my_player)
-
-
-#Load in background image
-background_image = pygame.transform.scale(pygame.image.load("assets/images/background.png"),
-                                          (WINDOW_WIDTH, WINDOW_HEIGHT))
-background_rect = background_image.get_rect()
-background_rect.topleft = (0,0)
-
-#create a game
-my_game = Game(my_player, my_zombie_group, my_platform_group, my_portal_group, my_bullet_group, my_ruby_group)
-my_game.pause_game("Zombie Knight!", "Press 'Enter' to begin", "v1.0.2")
-pygame.mixer.music.play(-1, 0.0)
-
-"""MAIN GAME LOOP"""
-running = True
-while running:
-    #Check to see if user wants to quit
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-
-        if event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_SPACE:
-                my_player.jump()
-            elif event.key == pygame.K_UP or event.key == pygame.K_w:
-                my_player.fire()
-
-            # #rain zombies DEBUG
-            # elif event.key == pygame.K_RETURN:
-            #     my_zombie_group.add(Zombie(my_platform_group, my_portal_group, 2, 7))
-
-    #blit the background
-    DISPLAY_SURFACE.blit(background_image, background_rect)
-
-    #draw our tiles
-    my_main_tile_group.update()
-    my_main_tile_group.draw(DISPLAY_SURFACE)
-
-    #draw and update sprite groups
-    my_portal_group.update()
-    my_portal_group.draw(DISPLAY_SURFACE)
-
-    my_player_group.update()
-    my_player_group.draw(DISPLAY_SURFACE)
-
-    my_bullet_group.update()
-    my_bullet_group.draw(DISPLAY_SURFACE)
-
-    my_zombie_group.update()
-    my_zombie_group.draw(DISPLAY_SURFACE)
-
-    my_ruby_group.update()
-    my_ruby_group.draw(DISPLAY_SURFACE)
-
-    #update and draw game
-    my_game.update()
-    my_game.draw()
-
-    #update display and tick clock
-    pygame.display.update()
-    CLOCK.tick(FPS)
-
-#end the game
-pygame.quit()
+if __name__ == "__main__":
+    main()